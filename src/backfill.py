@@ -0,0 +1,393 @@
+"""
+Rebuild the game-chat tables from the game-chat channel's history.
+
+    PYTHONPATH=src python src/backfill.py                   # live, whole channel
+    PYTHONPATH=src python src/backfill.py --since 2024-01-01
+    PYTHONPATH=src python src/backfill.py --record history.jsonl
+    PYTHONPATH=src python src/backfill.py --file history.jsonl
+
+Live runs page through the channel with one history cursor per time slice,
+`--slices` at a time. Messages are parsed in a process pool, and the rows
+are bulk loaded with COPY into a staging table and moved over with
+INSERT ... ON CONFLICT (message_id) DO NOTHING, so rows that are already
+stored, by the bot or an earlier run, are skipped. The rows that were
+inserted are added to the hourly rollups in the same statement. Messages
+that fail to parse and rows the database rejects are logged, counted and
+skipped, so one bad message does not stop the run.
+
+Progress is saved to the checkpoint file after every written batch. Run the
+same command again to resume an interrupted run, delete the file to start
+over. A history file has one JSON object per line with "id", "content" and
+"created_at" (ISO 8601), the format `--record` writes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import AsyncIterator
+import asyncpg
+import discord
+from config.config import DiscordConfig
+from config.logger_config import get_logger
+from db.batch_writer import game_chat_row
+from db.db_init import create_tables, engine
+from db.rollup import HOURLY_TABLES, rollup_sql
+from prices.items import item_catalog
+from prices.prices import price_service, save_json
+from webhooks.webhooks import (
+    MessageCategory,
+    extractLootValue,
+    parseGameChatMessage
+)
+
+logger = get_logger(__name__)
+
+discord_config = DiscordConfig(".env")
+
+# Messages per parsed and written batch
+BATCH_SIZE = 2000
+
+HistoryMessage = tuple[int, str, str]   # id, content, created_at
+
+
+##########################
+###### Parsing, in worker processes
+##########################
+def init_worker():
+    # Drops without a coins value are priced from the last saved snapshot
+    item_catalog.load()
+    price_service.load()
+
+
+def fits_columns(model, row: dict) -> bool:
+    """
+    False if a string in row is longer than its column allows
+    """
+    for column, value in row.items():
+        length = getattr(model.__table__.c[column].type, "length", None)
+        if length is not None and isinstance(value, str) and len(value) > length:
+            return False
+    return True
+
+
+def parse_batch(messages: list[HistoryMessage]) -> tuple[dict[str, list[dict]], Counter]:
+    """
+    Parse a batch of messages into rows, grouped by table name
+
+    Messages that fail to parse, and rows that would not fit their table,
+    are skipped and counted.
+    """
+    rows: dict[str, list[dict]] = {}
+    skipped = Counter()
+    for message_id, content, created_at in messages:
+        try:
+            no_emoji_message = content[content.find(">") + 1:]
+            record = parseGameChatMessage(no_emoji_message)
+            if record is None:
+                continue
+            if record.category in (MessageCategory.PK, MessageCategory.DROP) and record.loot_value is None:
+                record.loot_value = int(extractLootValue(no_emoji_message, record.category))
+            record.message_id = message_id
+            table_row = game_chat_row(record)
+            if table_row is None:
+                continue
+            model, row = table_row
+            row["date"] = datetime.fromisoformat(created_at)
+        except Exception as e:
+            skipped["unparsable"] += 1
+            logger.warning(f"Skipped message {message_id}, failed to parse it: {e!r}")
+            continue
+        if not fits_columns(model, row):
+            skipped["rejected"] += 1
+            logger.warning(f"Skipped message {message_id}, a value is too long for {model.__tablename__}: {row}")
+            continue
+        rows.setdefault(model.__tablename__, []).append(row)
+    return rows, skipped
+
+
+##########################
+###### Writing
+##########################
+async def copy_rows(rows_by_table: dict[str, list[dict]]) -> int:
+    """
+    Bulk load rows with COPY, skipping messages that are already stored
+
+    Returns the number of rows inserted.
+    """
+    inserted = 0
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        pg = raw_connection.driver_connection   # asyncpg
+        async with pg.transaction():
+            for table, rows in rows_by_table.items():
+                columns = list(rows[0])
+                column_list = ", ".join(columns)
+                staging = f"{table}_backfill"
+                await pg.execute(
+                    f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+                    f"SELECT {column_list} FROM {table} WITH NO DATA"
+                )
+                await pg.copy_records_to_table(
+                    staging,
+                    records=[tuple(row[column] for column in columns) for row in rows],
+                    columns=columns
+                )
+                insert_sql = (
+                    f"INSERT INTO {table} ({column_list}) "
+                    f"SELECT {column_list} FROM {staging} "
+                    "ON CONFLICT (message_id) DO NOTHING"
+                )
+                if table in HOURLY_TABLES:
+                    # Only rows that were inserted count towards the hourly totals
+                    inserted += await pg.fetchval(
+                        f"WITH stored AS ({insert_sql} RETURNING rsn, date, loot_big_int), "
+                        f"rolled_up AS ({rollup_sql(table, 'stored')}) "
+                        "SELECT count(*) FROM stored"
+                    )
+                else:
+                    status = await pg.execute(insert_sql)
+                    inserted += int(status.split()[-1])     # "INSERT 0 <rows>"
+    return inserted
+
+
+async def write_rows(rows_by_table: dict[str, list[dict]], metrics: Counter) -> int:
+    """
+    copy_rows, in halves down to single rows if the database rejects one
+
+    Rows rejected on their own are dropped and counted. Returns the number
+    of rows inserted.
+    """
+    try:
+        return await copy_rows(rows_by_table)
+    except (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError) as e:
+        rows = [(table, row) for table, table_rows in rows_by_table.items() for row in table_rows]
+        if len(rows) == 1:
+            metrics["rejected"] += 1
+            logger.error(f"Dropped a row the db rejected, {rows[0][0]} {rows[0][1]}: {e}")
+            return 0
+    middle = len(rows) // 2
+    inserted = 0
+    for half in (rows[:middle], rows[middle:]):
+        half_by_table: dict[str, list[dict]] = {}
+        for table, row in half:
+            half_by_table.setdefault(table, []).append(row)
+        inserted += await write_rows(half_by_table, metrics)
+    return inserted
+
+
+class Checkpoint:
+    """
+    Resume state of a backfill, saved after every written batch
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.state: dict = {}
+
+    def load(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            self.state = {}
+        return self.state
+
+    def save(self):
+        save_json(self.path, self.state)
+
+
+class Backfill:
+    """
+    Parse batches in a process pool and write them in order
+
+    Up to `parallel` batches per source are parsed at once. Batches are
+    written in the order they were read, so after each write everything up
+    to that batch is stored and the checkpoint can move past it.
+    """
+    def __init__(self, pool: ProcessPoolExecutor, parallel: int):
+        self.pool = pool
+        self.parallel = parallel
+        self.metrics = Counter()
+        self.started_at = time.perf_counter()
+
+    async def run_source(
+        self,
+        batches: AsyncIterator[list[HistoryMessage]],
+        on_written
+    ):
+        loop = asyncio.get_running_loop()
+        pending = deque()
+
+        async def write_oldest():
+            batch, parsing = pending.popleft()
+            rows_by_table, skipped = await parsing
+            self.metrics.update(skipped)
+            rows = sum(len(rows) for rows in rows_by_table.values())
+            inserted = await write_rows(rows_by_table, self.metrics) if rows else 0
+            self.metrics["messages"] += len(batch)
+            self.metrics["rows"] += rows
+            self.metrics["inserted"] += inserted
+            on_written(batch)
+            self.log_progress()
+
+        async for batch in batches:
+            pending.append((batch, loop.run_in_executor(self.pool, parse_batch, batch)))
+            if len(pending) >= self.parallel:
+                await write_oldest()
+        while pending:
+            await write_oldest()
+
+    def log_progress(self):
+        elapsed = time.perf_counter() - self.started_at
+        logger.info(
+            f"{self.metrics['messages']:,} messages, {self.metrics['rows']:,} rows "
+            f"({self.metrics['inserted']:,} new), "
+            f"{self.metrics['unparsable']:,} unparsable, {self.metrics['rejected']:,} rejected, "
+            f"{self.metrics['messages'] / elapsed:,.0f} messages/s"
+        )
+
+
+##########################
+###### Sources
+##########################
+async def file_batches(path: str, skip: int) -> AsyncIterator[list[HistoryMessage]]:
+    """
+    Batches from a recorded history file, after the first `skip` lines
+    """
+    batch = []
+    with open(path, 'r') as f:
+        for index, line in enumerate(f):
+            if index < skip or not line.strip():
+                continue
+            message = json.loads(line)
+            batch.append((int(message["id"]), message["content"], message["created_at"]))
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = []
+                await asyncio.sleep(0)
+    if batch:
+        yield batch
+
+
+async def channel_batches(
+    channel: discord.TextChannel,
+    after: int,
+    before: int,
+    record_file=None
+) -> AsyncIterator[list[HistoryMessage]]:
+    """
+    Batches of the channel's messages between two snowflakes, oldest first
+    """
+    batch = []
+    async for message in channel.history(
+        limit=None,
+        after=discord.Object(after),
+        before=discord.Object(before),
+        oldest_first=True
+    ):
+        history_message = (message.id, message.content, message.created_at.isoformat())
+        if record_file is not None:
+            record_file.write(json.dumps({
+                "id": message.id,
+                "content": message.content,
+                "created_at": history_message[2]
+            }) + "\n")
+        batch.append(history_message)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def split_range(after: int, before: int, slices: int) -> list[list[int]]:
+    """
+    Split a snowflake range into `slices` consecutive [after, before) ranges
+
+    Snowflakes grow with time, so every slice covers the same length of time.
+    """
+    step = max((before - after) // slices, 1)
+    bounds = [after + step * i for i in range(slices)] + [before]
+    return [[bounds[i], bounds[i + 1]] for i in range(slices) if bounds[i] < bounds[i + 1]]
+
+
+async def backfill_file(args, backfill: Backfill, checkpoint: Checkpoint):
+    state = checkpoint.load()
+    if state.get("file") != os.path.abspath(args.file):
+        state.clear()
+        state.update({"file": os.path.abspath(args.file), "lines": 0})
+
+    def on_written(batch: list[HistoryMessage]):
+        state["lines"] += len(batch)
+        checkpoint.save()
+
+    await backfill.run_source(file_batches(args.file, state["lines"]), on_written)
+
+
+async def backfill_live(args, backfill: Backfill, checkpoint: Checkpoint):
+    client = discord.Client(intents=discord.Intents.default())
+    await client.login(discord_config.DISCORD_TOKEN)
+    record_file = open(args.record, 'a') if args.record else None
+    try:
+        channel = await client.fetch_channel(int(discord_config.GAME_CHAT_CHANNEL_ID))
+        state = checkpoint.load()
+        if state.get("channel") != channel.id:
+            since = (
+                datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc)
+                if args.since else channel.created_at
+            )
+            after = discord.utils.time_snowflake(since)
+            before = discord.utils.time_snowflake(datetime.now(timezone.utc))
+            state.clear()
+            state.update({
+                "channel": channel.id,
+                "slices": split_range(after, before, args.slices)
+            })
+            checkpoint.save()
+
+        async def run_slice(index: int):
+            after, before = state["slices"][index]
+
+            def on_written(batch: list[HistoryMessage]):
+                # Everything in this slice up to the batch's last message is stored
+                state["slices"][index][0] = batch[-1][0]
+                checkpoint.save()
+
+            await backfill.run_source(
+                channel_batches(channel, after, before, record_file),
+                on_written
+            )
+
+        await asyncio.gather(*[run_slice(index) for index in range(len(state["slices"]))])
+    finally:
+        if record_file is not None:
+            record_file.close()
+        await client.close()
+
+
+async def main(args):
+    await create_tables()
+    checkpoint = Checkpoint(args.checkpoint)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as pool:
+        backfill = Backfill(pool, parallel=args.workers)
+        if args.file:
+            await backfill_file(args, backfill, checkpoint)
+        else:
+            await backfill_live(args, backfill, checkpoint)
+    backfill.log_progress()
+    logger.info(f"Backfill complete: {dict(backfill.metrics)}")
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild game-chat tables from channel history")
+    parser.add_argument("--file", help="read a recorded history file instead of the channel")
+    parser.add_argument("--record", help="also append the live history to this file")
+    parser.add_argument("--since", help="live: start at this date (YYYY-MM-DD)")
+    parser.add_argument("--slices", type=int, default=4, help="live: history cursors at a time")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="parser processes")
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.json")
+    asyncio.run(main(parser.parse_args()))
@@ -1,54 +1,42 @@
 import asyncio
 import discord
-from datetime import datetime
 from discord.ext import commands, tasks
-from kick.kick import get_all_kick_stream_status, read_streamers
+from kick.kick import (
+    browser_pool,
+    kick_fetcher,
+    get_all_kick_stream_status,
+    read_streamers
+)
 from twitch.twitch import (
+    close_twitch_session,
     get_all_twitch_stream_status,
+    handle_twitch_stream_event,
+    open_twitch_session,
     update_user_access_token
 )
+from twitch.eventsub import EventSubManager
 from db.db_init import (
     async_session,
     create_tables
 )
-from db.streamer import (
-    get_live_and_offline_streamers_db
-)
-from db.drop import (
-    insert_drop_db,
-    get_drop_sum_values_db,
-    get_all_drop_sum_values_db
-)
-from db.death import (
-    get_all_deaths_sum_values_db,
-    insert_death_db
-)
-from db.pb import (
-    get_all_personal_best_db,
-    insert_personal_best_db
-)
-from db.pk import (
-    get_all_pk_sum_values_db,
-    get_sum_pk_db,
-    insert_player_kill_db,
-)
-from db.streamer import (
-    get_live_and_offline_streamers_db,
-)
+from db.streamer import streamer_cache
+from db.batch_writer import BatchWriter
+from db.rollup import rebuild_rollups
+from db.live_leaderboard import live_leaderboards
 from config.logger_config import get_logger
-from utils.utils import format_live_and_not_live_lists
-from config.config import DiscordConfig
+from utils.utils import StreamerBoard
+from config.config import DiscordConfig, TwitchConfig
 from webhooks.webhooks import (
+    GameChatRecord,
     MessageCategory,
-    getMessageCategory,
-    sendContentToWebhook,
-    extractRSN,
-    extractDrop,
-    extractLootValue,
-    extractTimeInSeconds,
-    checkForBingoDrop,
-    extractBoss
+    closeWebhookSession,
+    openWebhookSession,
+    extractLootValue
 )
+from webhooks.pipeline import GameChatPipeline
+from webhooks.delivery import webhook_delivery
+from prices.items import item_catalog
+from prices.prices import close_prices_session, price_config, price_service
 
 from rich import print
 
@@ -72,11 +60,37 @@ STREAMERS_CHANNEL_ID = discord_config.STREAMERS_CHANNEL_ID
 STREAMERS_MESSAGE_ID = discord_config.STREAMERS_MESSAGE_ID
 GAME_CHAT_CHANNEL_ID = int(discord_config.GAME_CHAT_CHANNEL_ID)
 
+# Game-chat records are stored in batches, see handle_game_chat_record, and
+#   every stored PK, death and drop is counted in the live leaderboards
+game_chat_writer = BatchWriter(async_session, on_stored=live_leaderboards.add_rows)
+
+# Push-based Twitch live/offline detection, None to rely on polling only
+twitch_config = TwitchConfig(".env")
+eventsub = None
+if twitch_config.TWITCH_EVENTSUB_TRANSPORT:
+    async def on_twitch_stream_event(event_type: str, event: dict):
+        await handle_twitch_stream_event(client, event_type, event)
+
+    eventsub = EventSubManager(
+        on_twitch_stream_event,
+        "input/twitch_streamers.txt",
+        transport=twitch_config.TWITCH_EVENTSUB_TRANSPORT
+    )
+
 
 @client.event
 async def on_ready():
     logger.info(f"Bot is ready and logged in as {client.user}")
     await client.wait_until_ready()
+    if eventsub:
+        # EventSub reports transitions, polling is only a reconciliation sweep
+        check_twitch_streams_periodically.change_interval(minutes=10)
+        eventsub.start()
+    # on_ready fires again after a reconnect
+    if not refresh_prices_periodically.is_running():
+        refresh_prices_periodically.start()
+    if not log_game_chat_stats_periodically.is_running():
+        log_game_chat_stats_periodically.start()
     # refresh_token_periodically.start()
     # await asyncio.gather(
     #     check_kick_streams_periodically.start(),
@@ -109,92 +123,56 @@ async def on_message(message: discord.Message):
 
     """
     
-    # send message to appropriate channel via webhook
-    category = None
+    # Only queue here, parsing, pricing and storing happen in game_chat_pipeline
     if message.channel.id == GAME_CHAT_CHANNEL_ID:
-        # <:TaskMastericon:1147705076677345322>ScytheMane has completed the Hard Kandarin diary.
-        #   Remove the prefix, <:TaskMastericon:1147705076677345322>
-        no_emoji_message = message.content.replace('\\', '')
-        emoji_end_index = message.content.find(">")
-        if emoji_end_index:
-            # no_emoji_message is ScytheMane has completed the Hard Kandarin diary.
-            no_emoji_message = message.content[emoji_end_index + 1:]
-
-            content_dict = getMessageCategory(no_emoji_message)
-            content_dict = checkForBingoDrop(no_emoji_message, content_dict)
-            
-            if content_dict:
-                webhook_url = content_dict.get('url', None)
-                coded_message = content_dict.get('message', None)  # has new prefix emoji
-                category = content_dict.get('category', None)
-                team_name = content_dict.get('bingo_team', None)
-                is_bingo = content_dict.get('is_bingo', False)
-                # print(f"coded_message is: {coded_message}")
-
-                # try:
-                #     if is_bingo:
-                #         if team_name == "j22":
-                #             await sendContentToWebhook(
-                #                 webhook_url=webhook_config.J22_BINGO_DROPS_URL,
-                #                 message=coded_message
-                #             )
-                #         elif team_name == "vendirz":
-                #             await sendContentToWebhook(
-                #                 webhook_url=webhook_config.VENDIRZ_BINGO_DROPS_URL,
-                #                 message=coded_message
-                #             )
-                # except Exception as e:
-                #     logger.error(f"Failed to send content to webhook j22 or vendirz bingo drops - {e}")
-
-                # If valid category and webhook_url is valid
-                # try:
-                #     await sendContentToWebhook(
-                #         webhook_url=webhook_url,
-                #         message=coded_message
-                #     )
-                # except Exception as e:
-                #     logger.error(f"Failed to send content to webhook - {e}")
-
-        # Send relevant information to database
-        if category == MessageCategory.PK:
-            # send to database
-            loot_string = await extractLootValue(no_emoji_message, MessageCategory.PK)
-            data = {
-                "rsn": extractRSN(no_emoji_message, MessageCategory.PK),
-                "loot_string": loot_string,
-                "loot_big_int": int(loot_string)
-            }
-            await insert_player_kill_db(async_session, data)
-        elif category == MessageCategory.DEATH:
-            # send to database
-            loot_string = await extractLootValue(no_emoji_message, MessageCategory.DEATH)
-            data = {
-                "rsn": extractRSN(no_emoji_message, MessageCategory.DEATH),
-                "loot_string": loot_string,
-                "loot_big_int": int(loot_string)
-            }
-            await insert_death_db(async_session, data)
-        elif category == MessageCategory.DROP:
-            # send to database
-            loot_string = await extractLootValue(no_emoji_message, MessageCategory.DROP)
-            data = {
-                "rsn": extractRSN(no_emoji_message, MessageCategory.DROP),
-                "item": extractDrop(no_emoji_message, MessageCategory.DROP),
-                "loot_string": loot_string,
-                "loot_big_int": int(loot_string)
-            }
-            await insert_drop_db(async_session, data)
-        elif category == MessageCategory.PERSONAL_BEST:
-            # send to database
-            data = {
-                "rsn": extractRSN(no_emoji_message, MessageCategory.PERSONAL_BEST),
-                "duration": extractTimeInSeconds(no_emoji_message)
-            }
-            await insert_personal_best_db(async_session, data)
-
-        # Always send content to bingo-drops
-        if is_bingo:
-            print(f"Yes bingo drop! Act like sending to webhook bingo-drops...")
+        await game_chat_pipeline.submit(message.id, message.content)
+
+
+async def handle_game_chat_record(no_emoji_message: str, record: GameChatRecord):
+    """
+        Send a parsed in-game message to its webhook and store it in database
+    """
+    # Queued, so a burst of game chat never waits on Discord's rate limits
+    # if record.is_bingo:
+    #     if record.bingo_team == "j22":
+    #         webhook_delivery.enqueue(
+    #             webhook_url=webhook_config.J22_BINGO_DROPS_URL,
+    #             message=record.message
+    #         )
+    #     elif record.bingo_team == "vendirz":
+    #         webhook_delivery.enqueue(
+    #             webhook_url=webhook_config.VENDIRZ_BINGO_DROPS_URL,
+    #             message=record.message
+    #         )
+
+    # If valid category and webhook_url is valid
+    # webhook_delivery.enqueue(
+    #     webhook_url=record.url,
+    #     message=record.message
+    # )
+
+    # Send relevant information to database
+    if record.category in (MessageCategory.PK, MessageCategory.DROP) and record.loot_value is None:
+        # No coins value in the message, use the item's price
+        with game_chat_pipeline.stage("price"):
+            record.loot_value = int(extractLootValue(no_emoji_message, record.category))
+
+    with game_chat_pipeline.stage("store"):
+        game_chat_writer.put(record)
+
+    # Always send content to bingo-drops
+    if record.is_bingo:
+        print("Yes bingo drop! Act like sending to webhook bingo-drops...")
+
+
+game_chat_pipeline = GameChatPipeline(handle_game_chat_record)
+
+
+@tasks.loop(seconds=600)  # every 10 minutes
+async def log_game_chat_stats_periodically():
+    logger.info(f"Game-chat pipeline: {game_chat_pipeline.stats()}")
+    logger.info(f"Game-chat writer: {game_chat_writer.queue_depth()} buffered, "
+                f"last flush {game_chat_writer.last_flush_ms:.1f} ms")
 
 
 @tasks.loop(seconds=3600)  # every hour
@@ -205,6 +183,13 @@ async def refresh_token_periodically():
         logger.error(f"Error with refresh token periodically: {e}")
 
 
+@tasks.loop(seconds=int(price_config.PRICES_REFRESH_SECONDS))
+async def refresh_prices_periodically():
+    # Drops are valued from this snapshot, never by a request of their own
+    await item_catalog.refresh()    # only when a day old
+    await price_service.refresh()
+
+
 @tasks.loop(seconds=60)  # every minute
 async def check_kick_streams_periodically():
     kick_streamers = read_streamers("input/kick_streamers.txt")
@@ -223,33 +208,95 @@ async def check_twitch_streams_periodically():
         logger.error(f"Error with Twitch streams periodic check: {e}")
 
 
+# Streamer live, not live msg state - only changed pages are edited
+streamer_board = StreamerBoard(int(STREAMERS_CHANNEL_ID), int(STREAMERS_MESSAGE_ID))
+streamer_board_lock = asyncio.Lock()
+streamers_message_refresh: asyncio.Task | None = None
+streamers_message_dirty = False     # a transition since the last render started
+STREAMERS_MESSAGE_DEBOUNCE_SECONDS = 5
+
+
+async def update_streamer_live_not_live_msg():
+    """
+    Render the streamer lists from the cache and edit the pages that changed
+    """
+    async with streamer_board_lock:
+        live, not_live = streamer_cache.get_live_and_offline()
+        await streamer_board.render(client, live, not_live)
+
+
+def schedule_streamer_live_not_live_msg(streamer: dict):
+    """
+    Streamer cache listener - re-render shortly after a live/offline transition
+
+    Transitions within the debounce window share one edit, and one that
+    arrives while the edit is rendering gets another after it.
+    """
+    global streamers_message_refresh, streamers_message_dirty
+    streamers_message_dirty = True
+    if streamers_message_refresh is not None and not streamers_message_refresh.done():
+        return
+
+    async def refresh():
+        global streamers_message_dirty
+        while streamers_message_dirty:
+            await asyncio.sleep(STREAMERS_MESSAGE_DEBOUNCE_SECONDS)
+            streamers_message_dirty = False
+            try:
+                await update_streamer_live_not_live_msg()
+            except Exception as e:
+                logger.error(f"Failed to edit streamer live, not live msg: {e}")
+
+    streamers_message_refresh = asyncio.create_task(refresh())
+
+
+streamer_cache.add_listener(schedule_streamer_live_not_live_msg)
+
+
 @tasks.loop(seconds=60)  # every minute
 async def edit_streamer_live_not_live_msg():
     try:
-        logger.info("Editing streamer live, not live msg")
-        channel = client.get_channel(int(STREAMERS_CHANNEL_ID))
-        message_to_edit = await channel.fetch_message(int(STREAMERS_MESSAGE_ID))
-        live, not_live = await get_live_and_offline_streamers_db(async_session)
-        formatted_string = format_live_and_not_live_lists(live, not_live)
-        await message_to_edit.edit(content=formatted_string, suppress=True)
+        await update_streamer_live_not_live_msg()
     except Exception as e:
         logger.error(f"Failed to edit streamer live, not live msg: {e}")
 
 
 async def initialize_db() -> None:
     """
-    Create table if it does not exist
+    Create table if it does not exist, fill new rollup tables, then load the
+    streamer cache
 
     Returns
     ------------
     None
     """
     await create_tables()
+    await rebuild_rollups(only_empty=True)
+    await streamer_cache.load(async_session)
 
 
 async def main():
     await initialize_db()
-    await client.start(DISCORD_TOKEN)
+    await live_leaderboards.warm(async_session)    # before the writer stores anything
+    game_chat_writer.start()
+    game_chat_pipeline.start()
+    item_catalog.load()
+    price_service.load()   # last run's prices until the first refresh
+    await open_twitch_session()
+    await openWebhookSession()
+    try:
+        await client.start(DISCORD_TOKEN)
+    finally:
+        if eventsub:
+            await eventsub.close()
+        await close_twitch_session()
+        await game_chat_pipeline.close()
+        await game_chat_writer.close()
+        await webhook_delivery.close()
+        await closeWebhookSession()
+        await close_prices_session()
+        await kick_fetcher.close()
+        await browser_pool.close()
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -47,6 +47,14 @@ class WebhookConfig:
         self.LEFT_URL = os.environ.get("LEFT_URL")
         self.BINGO_URL = ""  # FIXME
 
+        # Delivery queue - pending posts per webhook, and what happens to
+        #   posts beyond that: "drop", "merge" or "spill" (to WEBHOOK_SPILL_DIR)
+        self.WEBHOOK_QUEUE_SIZE = os.environ.get("WEBHOOK_QUEUE_SIZE", "100")
+        self.WEBHOOK_OVERFLOW_POLICY = os.environ.get("WEBHOOK_OVERFLOW_POLICY", "merge")
+        self.WEBHOOK_SPILL_DIR = os.environ.get("WEBHOOK_SPILL_DIR", "webhook_spill")
+        # Seconds to hold game-chat lines so a burst goes out as one post, 0 to disable
+        self.WEBHOOK_COALESCE_WINDOW = os.environ.get("WEBHOOK_COALESCE_WINDOW", "1")
+
 
 class TwitchConfig:
     """
@@ -59,3 +67,33 @@ class TwitchConfig:
         self.TWITCH_CLIENT_ID = os.environ.get("TWITCH_CLIENT_ID")
         self.TWITCH_CLIENT_SECRET = os.environ.get("TWITCH_CLIENT_SECRET")
         self.TWITCH_ACCESS_TOKEN = os.environ.get("TWITCH_ACCESS_TOKEN")
+
+        # EventSub - transport is "websocket" or "webhook", unset to only poll
+        #   Point the URLs at a local fake server (e.g. `twitch event websocket
+        #   start-server`) for testing
+        self.TWITCH_EVENTSUB_TRANSPORT = os.environ.get("TWITCH_EVENTSUB_TRANSPORT")
+        self.TWITCH_EVENTSUB_WS_URL = os.environ.get(
+            "TWITCH_EVENTSUB_WS_URL", "wss://eventsub.wss.twitch.tv/ws"
+        )
+        self.TWITCH_EVENTSUB_SUBSCRIPTIONS_URL = os.environ.get(
+            "TWITCH_EVENTSUB_SUBSCRIPTIONS_URL",
+            "https://api.twitch.tv/helix/eventsub/subscriptions"
+        )
+        self.TWITCH_EVENTSUB_SECRET = os.environ.get("TWITCH_EVENTSUB_SECRET")
+        self.TWITCH_EVENTSUB_CALLBACK_URL = os.environ.get("TWITCH_EVENTSUB_CALLBACK_URL")
+        self.TWITCH_EVENTSUB_PORT = os.environ.get("TWITCH_EVENTSUB_PORT", "8443")
+
+
+class PriceConfig:
+    """
+        Path to .env file
+        Example: path=".env"
+    """
+    def __init__(self, env_file: str = None):
+        load_dotenv(env_file)
+        # Point at a local fake server for testing
+        self.PRICES_BASE_URL = os.environ.get(
+            "PRICES_BASE_URL", "https://prices.runescape.wiki/api/v1/osrs"
+        )
+        self.PRICES_REFRESH_SECONDS = os.environ.get("PRICES_REFRESH_SECONDS", "300")
+        self.PRICES_CACHE_DIR = os.environ.get("PRICES_CACHE_DIR", "prices_cache")
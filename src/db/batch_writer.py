@@ -0,0 +1,315 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Callable
+from datetime import datetime, timezone
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from db.db_init import (
+    Death,
+    Drop,
+    PersonalBest,
+    PlayerKill,
+    rollup_tables,
+)
+from db.rollup import add_to_rollup
+from config.logger_config import get_logger
+from webhooks.webhooks import GameChatRecord, MessageCategory
+
+logger = get_logger(__name__)
+
+# Rows per INSERT, keeps a backlog after an outage under Postgres' limit of
+# 32767 bind parameters per statement
+MAX_INSERT_ROWS = 1000
+
+
+def player_kill_row(record: GameChatRecord) -> dict:
+    return {
+        "rsn": record.rsn,
+        "loot_big_int": record.loot_value,
+        "loot_string": str(record.loot_value),
+        "message_id": record.message_id
+    }
+
+
+def death_row(record: GameChatRecord) -> dict:
+    return {
+        "rsn": record.rsn,
+        "loot_big_int": record.loot_value,
+        "loot_string": str(record.loot_value),
+        "message_id": record.message_id
+    }
+
+
+def drop_row(record: GameChatRecord) -> dict:
+    return {
+        "rsn": record.rsn,
+        "item": record.item,
+        "loot_big_int": record.loot_value,
+        "loot_string": str(record.loot_value),
+        "message_id": record.message_id
+    }
+
+
+def personal_best_row(record: GameChatRecord) -> dict:
+    return {
+        "rsn": record.rsn,
+        "boss": record.boss,
+        "duration": record.duration,
+        "message_id": record.message_id
+    }
+
+
+# Table and row of every category that is stored
+CATEGORY_TABLE = {
+    MessageCategory.PK: (PlayerKill, player_kill_row),
+    MessageCategory.DEATH: (Death, death_row),
+    MessageCategory.DROP: (Drop, drop_row),
+    MessageCategory.PERSONAL_BEST: (PersonalBest, personal_best_row),
+}
+
+
+def game_chat_row(record: GameChatRecord) -> tuple[type, dict] | None:
+    """
+    The table and row a record is stored as, None if it is not stored
+    """
+    table = CATEGORY_TABLE.get(record.category)
+    if table is None:
+        return None
+    if record.category == MessageCategory.PERSONAL_BEST and record.duration is None:
+        return None     # the time could not be read
+    model, make_row = table
+    return (model, make_row(record))
+
+
+def database_unavailable(e: Exception) -> bool:
+    """
+    True if the database could not be reached, as opposed to rejecting rows
+    """
+    return (
+        isinstance(e, (OperationalError, InterfaceError, OSError, asyncio.TimeoutError))
+        or getattr(e, "connection_invalidated", False)
+    )
+
+
+class BatchWriter:
+    """
+    Store game-chat records in batches from a background task.
+
+    `put` only buffers the record. The buffer is written once it holds
+    `batch_size` records, and otherwise every `flush_interval` seconds, with
+    one multi-row INSERT per table in a single transaction. A burst of game
+    chat costs a few round trips instead of one per message. The hourly
+    rollups are updated in the same transaction.
+
+    Rows are dated when they are put, not when the batch is written, and
+    rows whose Discord message was already stored are skipped. A
+    batch the database rejects, e.g. for a value too long for its column,
+    is written again in halves until the records it rejects on their own
+    are found, and those are dropped. A batch that fails because the
+    database is unavailable is retried with the next flush, as long as the
+    buffer stays under `max_buffer` records.
+
+    Parameters
+    ---------
+    async_session: async_sessionmaker
+
+    batch_size: int
+        Records that trigger a flush right away.
+
+    flush_interval: float
+        Seconds between flushes of a buffer smaller than batch_size.
+
+    max_buffer: int
+        Records kept while the database is unavailable, the oldest are
+        dropped beyond that.
+
+    on_stored: Callable[[type, list[tuple]], None] | None
+        Called after every commit with a loot table and the (rsn, date,
+        loot_big_int) rows that were inserted into it.
+    """
+    def __init__(
+        self,
+        async_session: async_sessionmaker,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_buffer: int = 10_000,
+        on_stored: Callable[[type, list[tuple]], None] | None = None
+    ):
+        self.async_session = async_session
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.on_stored = on_stored
+        self.metrics = Counter()
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._buffer: list[tuple[type, dict]] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._closing = False
+        self._flush_lock = asyncio.Lock()
+
+    def queue_depth(self) -> int:
+        return len(self._buffer)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def put(self, record: GameChatRecord) -> bool:
+        """
+        Buffer a record, returns False if it is not stored
+        """
+        table_row = game_chat_row(record)
+        if table_row is None:
+            return False
+        model, row = table_row
+        row["date"] = datetime.now(timezone.utc)
+        self._buffer.append((model, row))
+        self.metrics["buffered"] += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """
+        Write everything buffered so far in one transaction
+        """
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            batch = self._buffer
+            self._buffer = []
+            start = time.perf_counter()
+            rejected = self.metrics["rejected"]
+            try:
+                try:
+                    inserted = await self._write(batch)
+                except Exception as e:
+                    if database_unavailable(e):
+                        raise
+                    # The database rejected something in the batch, e.g. a
+                    #   value too long for its column, find it and drop it
+                    logger.error(f"Db rejected a batch of {len(batch)} game-chat records, isolating: {e}")
+                    inserted = await self._write_isolating(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} game-chat records to db: {e}")
+                self.metrics["failed_flushes"] += 1
+                # Rows of parts that did get written are skipped as duplicates
+                self._requeue(batch)
+                return
+            rejected = self.metrics["rejected"] - rejected
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            self.metrics["flushes"] += 1
+            self.metrics["written"] += inserted
+            self.metrics["duplicates"] += len(batch) - inserted - rejected
+            logger.info(
+                f"Wrote {inserted} of {len(batch)} game-chat records in {self.last_flush_ms:.1f} ms, "
+                f"{len(self._buffer)} buffered"
+            )
+
+    async def _write(self, batch: list[tuple[type, dict]]) -> int:
+        """
+        Insert batch in one transaction, returns the number of rows inserted
+        """
+        rows_by_model: dict[type, list[dict]] = {}
+        for model, row in batch:
+            rows_by_model.setdefault(model, []).append(row)
+
+        async with self.async_session() as session:
+            try:
+                inserted = 0
+                stored_by_model: dict[type, list[tuple]] = {}
+                for model, rows in rows_by_model.items():
+                    for i in range(0, len(rows), MAX_INSERT_ROWS):
+                        # A message that was already stored is skipped
+                        stmt = (
+                            insert(model)
+                            .values(rows[i:i + MAX_INSERT_ROWS])
+                            .on_conflict_do_nothing(index_elements=["message_id"])
+                        )
+                        if model in rollup_tables:
+                            # Only rows that were inserted count towards the hourly totals
+                            result = await session.execute(
+                                stmt.returning(model.rsn, model.date, model.loot_big_int)
+                            )
+                            stored = result.all()
+                            await add_to_rollup(session, model, stored)
+                            stored_by_model.setdefault(model, []).extend(stored)
+                            inserted += len(stored)
+                        else:
+                            result = await session.execute(stmt)
+                            inserted += result.rowcount
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+        if self.on_stored is not None:
+            for model, stored in stored_by_model.items():
+                try:
+                    self.on_stored(model, stored)
+                except Exception as e:
+                    logger.error(f"Failed to pass stored {model.__tablename__} rows on: {e}")
+        return inserted
+
+    async def _write_isolating(self, batch: list[tuple[type, dict]]) -> int:
+        """
+        Write batch in halves, down to single records, dropping the ones the
+        database rejects on their own
+
+        Re-raises if the database becomes unavailable meanwhile.
+        """
+        try:
+            return await self._write(batch)
+        except Exception as e:
+            if database_unavailable(e):
+                raise
+            if len(batch) == 1:
+                model, row = batch[0]
+                self.metrics["rejected"] += 1
+                logger.error(
+                    f"Dropped a game-chat record the db rejected, {model.__tablename__} {row}: "
+                    f"{getattr(e, 'orig', e)}"
+                )
+                return 0
+        middle = len(batch) // 2
+        return (
+            await self._write_isolating(batch[:middle])
+            + await self._write_isolating(batch[middle:])
+        )
+
+    def _requeue(self, batch: list[tuple[type, dict]]):
+        self._buffer = batch + self._buffer
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.metrics["dropped"] += overflow
+            logger.error(f"Game-chat write buffer full, dropped {overflow} records")
+
+    async def close(self):
+        """
+        Stop the background task and write what is left
+        """
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task    # finishes a flush that is under way
+            self._task = None
+        await self.flush()
+        self._closing = False
+        logger.info(
+            f"Game-chat writer: {dict(self.metrics)}, "
+            f"max flush {self.max_flush_ms:.1f} ms"
+        )
@@ -0,0 +1,73 @@
+"""
+Time streamer name lookups against the database in DATABASE_URL.
+
+    PYTHONPATH=src python -m db.benchmark
+    PYTHONPATH=src python -m db.benchmark --rows 100000 --lookups 1000
+
+Loads `--rows` names into a temporary table shaped like streamer_test and
+times the same random names looked up three ways: the old
+`name ILIKE :name`, `lower(name) = :name` without an index, and
+`lower(name) = :name` with the unique lower(name) index create_tables
+adds. Everything runs on one connection and is rolled back, streamer_test
+is not touched.
+"""
+import argparse
+import asyncio
+import random
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from db.db_init import engine
+
+
+async def time_lookups(conn: AsyncConnection, query: str, probes: list[str]) -> tuple[float, str]:
+    """
+    Average milliseconds per lookup, and the plan Postgres picked
+    """
+    plan = await conn.scalar(text(f"EXPLAIN {query}"), {"name": probes[0]})
+    start = time.perf_counter()
+    for name in probes:
+        await conn.execute(text(query), {"name": name})
+    return (time.perf_counter() - start) * 1000 / len(probes), plan
+
+
+async def benchmark_name_lookup(rows: int, lookups: int):
+    names = [f"Streamer_{i}" for i in range(rows)]
+    probes = [name.lower() for name in random.sample(names, lookups)]
+    async with engine.connect() as conn:
+        await conn.execute(text(
+            "CREATE TEMP TABLE bench_streamer (name varchar(40) PRIMARY KEY)"
+        ))
+        await conn.execute(
+            text("INSERT INTO bench_streamer (name) VALUES (:name)"),
+            [{"name": name} for name in names]
+        )
+        await conn.execute(text("ANALYZE bench_streamer"))
+
+        results = {
+            "name ILIKE :name": await time_lookups(
+                conn, "SELECT * FROM bench_streamer WHERE name ILIKE :name", probes
+            ),
+            "lower(name) = :name, no index": await time_lookups(
+                conn, "SELECT * FROM bench_streamer WHERE lower(name) = :name", probes
+            ),
+        }
+        await conn.execute(text("CREATE UNIQUE INDEX ON bench_streamer (lower(name))"))
+        await conn.execute(text("ANALYZE bench_streamer"))
+        results["lower(name) = :name, indexed"] = await time_lookups(
+            conn, "SELECT * FROM bench_streamer WHERE lower(name) = :name", probes
+        )
+        await conn.rollback()
+    await engine.dispose()
+
+    print(f"{rows:,} rows, {lookups:,} lookups")
+    for name, (ms, plan) in results.items():
+        print(f"{name:32} {ms:8.3f} ms/lookup   {plan}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time streamer name lookups")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(benchmark_name_lookup(args.rows, args.lookups))
@@ -6,6 +6,8 @@ from sqlalchemy import (
     String,
     DateTime,
     Boolean,
+    Index,
+    text,
 )
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
@@ -41,6 +43,14 @@ class Streamer(Base):
     url = Column(String(60), server_default="N/A")
 
 
+# Streamer names are case-insensitive, upserts conflict on lower(name)
+streamer_name_lower_index = Index(
+    "ix_streamer_test_name_lower",
+    func.lower(Streamer.name),
+    unique=True
+)
+
+
 class PersonalBest(Base):
     __tablename__ = 'personal_best_test'
     id = Column(Integer, primary_key=True)
@@ -48,6 +58,7 @@ class PersonalBest(Base):
     date = Column(DateTime(timezone=True), server_default=func.now())
     boss = Column(String(70))
     duration = Column(Float)
+    message_id = Column(BigInteger)   # source Discord message
 
 
 class Drop(Base):
@@ -58,6 +69,7 @@ class Drop(Base):
     item = Column(String(40))
     loot_big_int = Column(BigInteger)
     loot_string = Column(String(22))    # number with commas
+    message_id = Column(BigInteger)   # source Discord message
 
 
 class Death(Base):
@@ -67,6 +79,7 @@ class Death(Base):
     date = Column(DateTime(timezone=True), server_default=func.now())
     loot_big_int = Column(BigInteger)
     loot_string = Column(String(22))    # number with commas
+    message_id = Column(BigInteger)   # source Discord message
 
 
 class PlayerKill(Base):
@@ -76,12 +89,96 @@ class PlayerKill(Base):
     date = Column(DateTime(timezone=True), server_default=func.now())
     loot_big_int = Column(BigInteger)
     loot_string = Column(String(22))    # number with commas
+    message_id = Column(BigInteger)   # source Discord message
+
+
+# Loot per player and hour, kept up to date with every stored drop, death
+#   and player kill, so leaderboards do not re-sum the whole history.
+#   Rebuild them with `python -m db.rollup`
+class DropHourly(Base):
+    __tablename__ = 'drop_hourly_test'
+    rsn = Column(String(15), primary_key=True)
+    hour = Column(DateTime(timezone=True), primary_key=True)    # start, UTC
+    loot_big_int = Column(BigInteger, nullable=False, default=0)
+    row_count = Column(Integer, nullable=False, default=0)
+
+
+class DeathHourly(Base):
+    __tablename__ = 'death_hourly_test'
+    rsn = Column(String(15), primary_key=True)
+    hour = Column(DateTime(timezone=True), primary_key=True)    # start, UTC
+    loot_big_int = Column(BigInteger, nullable=False, default=0)
+    row_count = Column(Integer, nullable=False, default=0)
+
+
+class PlayerKillHourly(Base):
+    __tablename__ = 'player_kill_hourly_test'
+    rsn = Column(String(15), primary_key=True)
+    hour = Column(DateTime(timezone=True), primary_key=True)    # start, UTC
+    loot_big_int = Column(BigInteger, nullable=False, default=0)
+    row_count = Column(Integer, nullable=False, default=0)
+
+
+# Game-chat rows are unique per Discord message, so a message that is read
+#   twice (reconnects, reprocessing a channel) is only stored once. Older rows
+#   have no message id, NULLs do not conflict.
+game_chat_tables = (PersonalBest, Drop, Death, PlayerKill)
+message_id_indexes = [
+    Index(f"ix_{table.__tablename__}_message_id", table.message_id, unique=True)
+    for table in game_chat_tables
+]
+
+# Leaderboards sum loot over recent windows, the index covers the whole
+#   query so it can be answered with an index-only scan
+loot_tables = (Drop, Death, PlayerKill)
+date_rsn_indexes = [
+    Index(
+        f"ix_{table.__tablename__}_date_rsn",
+        table.date,
+        table.rsn,
+        postgresql_include=["loot_big_int"]
+    )
+    for table in loot_tables
+]
+
+# Hourly rollup of each loot table
+rollup_tables = {
+    Drop: DropHourly,
+    Death: DeathHourly,
+    PlayerKill: PlayerKillHourly,
+}
+rollup_hour_indexes = [
+    Index(
+        f"ix_{table.__tablename__}_hour_rsn",
+        table.hour,
+        table.rsn,
+        postgresql_include=["loot_big_int"]
+    )
+    for table in rollup_tables.values()
+]
 
 
 # Create table if not exist
 async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all skips columns and indexes of tables that already exist
+        for table in game_chat_tables:
+            await conn.execute(text(
+                f"ALTER TABLE {table.__tablename__} "
+                "ADD COLUMN IF NOT EXISTS message_id BIGINT"
+            ))
+        for index in [
+            streamer_name_lower_index,
+            *message_id_indexes,
+            *date_rsn_indexes,
+            *rollup_hour_indexes
+        ]:
+            await conn.run_sync(
+                lambda sync_conn, index=index: index.create(
+                    sync_conn, checkfirst=True
+                )
+            )
 
 
 if __name__ == '__main__':
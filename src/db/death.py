@@ -1,5 +1,5 @@
 # 1h, 3h, 6h, 12h, 24h
-# 24*7, 24*14, 14*30
+# 24*7, 24*14, 24*30
 
 # 2d, 7d, 14d, 30d
 
@@ -13,7 +13,14 @@ from sqlalchemy import (
 from sqlalchemy.sql.functions import sum
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from config.logger_config import get_logger
-from datetime import datetime, timedelta
+from db.rollup import add_to_rollup
+from db.leaderboard import (
+    LEADERBOARD_WINDOWS,
+    WindowLeaderboard,
+    get_window_sums_db
+)
+from webhooks.webhooks import GameChatRecord
+from datetime import datetime, timezone
 
 logger = get_logger(__name__)
 
@@ -64,38 +71,46 @@ async def get_all_deaths_sum_values_db(
 
     Return the sum of deaths estimated value for all rsn, in descending order
     """
-    async with async_session() as session:
-        try:
-            logger.info(f"Getting sum of deaths estimated value for all rsn from db")
-            stmt = (
-                select(Death.rsn, sum(Death.loot_big_int))
-                .group_by(Death.rsn)
-                .order_by(sum(Death.loot_big_int).desc())
-            )
-            if time_range_hours is not None:
-                stmt.where(Death.date >= datetime.now() - timedelta(hours=time_range_hours))
-            result = await session.execute(stmt)
-            rows = result.all()
-            return rows if rows else None   # Return all rows, row is a tuple
-        except Exception as e:
-            logger.error(f"Failed to get sum of deaths estimated value for all rsn from db: {e}")
-            await session.rollback()
+    # Read from the hourly rollup, see get_window_sums_db
+    window = "all" if time_range_hours is None else f"{time_range_hours}h"
+    leaderboard = await get_window_sums_db(async_session, Death, {window: time_range_hours})
+    if leaderboard is None:
+        return None
+    rows = leaderboard.window(window)
+    return rows if rows else None   # Return all rows, row is a tuple
+
+
+async def get_all_deaths_window_sums_db(
+    async_session: async_sessionmaker,
+    windows: dict[str, int] = LEADERBOARD_WINDOWS
+) -> WindowLeaderboard | None:
+    """
+    Return the sum of deaths estimated value for all rsn over every window at once
+
+    One query instead of one get_all_* query per window, see get_window_sums_db
+    """
+    return await get_window_sums_db(async_session, Death, windows)
 
 
 async def insert_death_db(
     async_session: async_sessionmaker,
-    data: dict
+    record: GameChatRecord
 ):
     async with async_session() as session:
         try:
-            logger.info(f"Inserting death for {data.get('rsn')} to db")
+            logger.info(f"Inserting death for {record.rsn} to db")
             new_drop = Death(
-                rsn=data.get('rsn'),
-                loot_big_int=data.get('loot_big_int'),
-                loot_string=data.get('loot_string')
+                rsn=record.rsn,
+                date=datetime.now(timezone.utc),
+                loot_big_int=record.loot_value,
+                loot_string=str(record.loot_value),
+                message_id=record.message_id
             )
             session.add(new_drop)
+            await add_to_rollup(
+                session, Death, [(new_drop.rsn, new_drop.date, new_drop.loot_big_int)]
+            )
             await session.commit()
         except Exception as e:
-            logger.error(f"Failed to add death for {data.get('rsn')} to db: {e}")
+            logger.error(f"Failed to add death for {record.rsn} to db: {e}")
             await session.rollback()
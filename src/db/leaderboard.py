@@ -0,0 +1,172 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import (
+    and_,
+    literal,
+    or_,
+    select,
+    union_all
+)
+from sqlalchemy.sql.functions import sum
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from db.db_init import rollup_tables
+from db.rollup import hour_of
+from config.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Recent total GP windows, name and length in hours
+LEADERBOARD_WINDOWS = {
+    "1h": 1,
+    "3h": 3,
+    "6h": 6,
+    "12h": 12,
+    "24h": 24,
+    "7d": 24 * 7,
+    "14d": 24 * 14,
+    "30d": 24 * 30,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class WindowLeaderboard:
+    """
+    Every player's loot total over several time windows, as of one moment
+
+    totals holds one total per window for each rsn, in the order of windows,
+    None for a window the player has no rows in.
+    """
+    table: str
+    as_of: datetime
+    windows: dict[str, int]
+    totals: dict[str, tuple[int | None, ...]]
+
+    def _index(self, window: str) -> int:
+        try:
+            return list(self.windows).index(window)
+        except ValueError:
+            raise KeyError(f"Unknown leaderboard window {window!r}, expected one of {list(self.windows)}")
+
+    def window(self, window: str) -> list[tuple[str, int]]:
+        """
+        (rsn, total) of everyone with rows in the window, in descending order
+        """
+        index = self._index(window)
+        rows = [
+            (rsn, totals[index]) for rsn, totals in self.totals.items()
+            if totals[index] is not None
+        ]
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows
+
+    def top(self, window: str, n: int = 10) -> list[tuple[str, int]]:
+        return self.window(window)[:n]
+
+    def total(self, rsn: str, window: str) -> int:
+        totals = self.totals.get(rsn)
+        if totals is None:
+            return 0
+        return totals[self._index(window)] or 0
+
+
+async def get_window_sums_db(
+    async_session: async_sessionmaker,
+    model,
+    windows: dict[str, int | None] = LEADERBOARD_WINDOWS
+) -> WindowLeaderboard | None:
+    """
+    Sum of loot per rsn over every window, in one query
+
+    Parameters
+    ----------
+    async_session: async_sessionmaker
+
+    model: Drop | PlayerKill | Death
+        Any game-chat table with rsn, date and loot_big_int, and an hourly
+        rollup in rollup_tables.
+
+    windows: dict[str, int | None]
+        Window name and length in hours, None for all history.
+
+    Whole hours are read from the hourly rollup, raw rows only for the
+    current hour and for the part of each window's first hour that falls
+    inside it, so the cost does not grow with history. Every window's sum
+    is a SUM(...) FILTER (WHERE ...) over both.
+    """
+    async with async_session() as session:
+        try:
+            logger.info(f"Getting {len(windows)} window sums for all rsn from {model.__tablename__}")
+            hourly = rollup_tables[model]
+            as_of = datetime.now(timezone.utc)
+            current_hour = hour_of(as_of)
+            # Start of each window, and of its first hour that is whole
+            starts = {
+                name: None if hours is None else as_of - timedelta(hours=hours)
+                for name, hours in windows.items()
+            }
+            whole_starts = {
+                name: None if start is None else hour_of(start) + timedelta(hours=1)
+                for name, start in starts.items()
+            }
+
+            rolled_up = (
+                select(
+                    hourly.rsn,
+                    hourly.hour.label("date"),
+                    hourly.loot_big_int.label("loot"),
+                    literal(True).label("rolled_up")
+                )
+                .where(hourly.hour < current_hour)
+            )
+            if None not in whole_starts.values():
+                rolled_up = rolled_up.where(hourly.hour >= min(whole_starts.values()))
+            raw = (
+                select(
+                    model.rsn,
+                    model.date,
+                    model.loot_big_int.label("loot"),
+                    literal(False).label("rolled_up")
+                )
+                .where(or_(
+                    model.date >= current_hour,
+                    *[
+                        and_(model.date >= starts[name], model.date < whole_starts[name])
+                        for name in windows if starts[name] is not None
+                    ]
+                ))
+            )
+            rows = union_all(rolled_up, raw).subquery()
+
+            def in_window(name: str):
+                if starts[name] is None:
+                    return or_(rows.c.rolled_up, rows.c.date >= current_hour)
+                return or_(
+                    and_(rows.c.rolled_up, rows.c.date >= whole_starts[name]),
+                    and_(
+                        ~rows.c.rolled_up,
+                        rows.c.date >= starts[name],
+                        # the rest of the first hour is in the rollup
+                        or_(rows.c.date < whole_starts[name], rows.c.date >= current_hour)
+                    )
+                )
+
+            stmt = (
+                select(rows.c.rsn, *[sum(rows.c.loot).filter(in_window(name)) for name in windows])
+                .group_by(rows.c.rsn)
+            )
+            result = await session.execute(stmt)
+            totals = {}
+            for row in result.all():
+                # SUM of a bigint is a numeric, read as Decimal
+                window_totals = tuple(None if total is None else int(total) for total in row[1:])
+                if any(total is not None for total in window_totals):
+                    totals[row[0]] = window_totals
+            return WindowLeaderboard(
+                table=model.__tablename__,
+                as_of=as_of,
+                windows=dict(windows),
+                totals=totals
+            )
+        except Exception as e:
+            logger.error(f"Failed to get window sums for all rsn from {model.__tablename__}: {e}")
+            await session.rollback()
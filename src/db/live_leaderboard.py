@@ -0,0 +1,310 @@
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from heapq import nlargest
+from math import ceil
+from operator import itemgetter
+from typing import Iterable
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from db.db_init import loot_tables
+from db.leaderboard import LEADERBOARD_WINDOWS, WindowLeaderboard
+from config.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Bucket:
+    """
+    Loot of one time bucket, per rsn and per row, rows in time order
+    """
+    __slots__ = ("number", "sums", "times", "rows")
+
+    def __init__(self, number: int):
+        self.number = number
+        self.sums: dict[str, list[int]] = {}    # rsn: [loot, rows]
+        self.times: list[float] = []
+        self.rows: list[tuple[str, int]] = []   # (rsn, loot), in the order of times
+
+
+class SlidingLeaderboard:
+    """
+    Every player's loot total over several sliding windows, kept in memory.
+
+    Rows are added to time buckets in a ring buffer that covers the longest
+    window. Each window keeps running totals per rsn and the position of
+    its start, and moving the start subtracts what fell out of it: whole
+    buckets at once, single rows only in the bucket the start is in. So
+    the totals match SUM(...) WHERE date >= now - window to the row, and a
+    top-N query is a heap over the players of one window, no SQL.
+
+    Buckets older than the longest window are expired as the ring wraps.
+
+    Parameters
+    ---------
+    windows: dict[str, int]
+        Window name and length in hours.
+
+    bucket_seconds: int
+        Bucket length, rows older than the longest window are dropped a
+        bucket at a time.
+    """
+    def __init__(
+        self,
+        windows: dict[str, int] = LEADERBOARD_WINDOWS,
+        bucket_seconds: int = 60
+    ):
+        self.windows = dict(windows)
+        self.bucket_seconds = bucket_seconds
+        self._lengths = [hours * 60 * 60 for hours in self.windows.values()]
+        longest = max(self._lengths)
+        self._ring: list[_Bucket | None] = [None] * (ceil(longest / bucket_seconds) + 2)
+        now = time.time()
+        # Per window: totals per rsn, start, and the first row inside it as
+        #   (bucket number, position in the bucket)
+        self._totals: list[dict[str, list[int]]] = [{} for _ in self._lengths]
+        self._starts = [now - length for length in self._lengths]
+        self._cursors = [[self._bucket_number(start), 0] for start in self._starts]
+        self._oldest = self._lengths.index(longest)
+
+    def __len__(self) -> int:
+        return sum(len(bucket.rows) for bucket in self._ring if bucket is not None)
+
+    def _bucket_number(self, when: float) -> int:
+        return int(when // self.bucket_seconds)
+
+    def _bucket(self, number: int) -> _Bucket | None:
+        bucket = self._ring[number % len(self._ring)]
+        return bucket if bucket is not None and bucket.number == number else None
+
+    def add(self, rsn: str, when: float, loot: int | None):
+        """
+        Count one stored row, `when` is its unix time
+        """
+        now = time.time()
+        self.advance(now)
+        when = min(when, now)   # a clock ahead of ours
+        if when < self._starts[self._oldest] or rsn is None:
+            return
+        loot = loot or 0
+        number = self._bucket_number(when)
+        index = number % len(self._ring)
+        bucket = self._ring[index]
+        if bucket is None or bucket.number != number:
+            # the ring covers the longest window, what was here has expired
+            bucket = self._ring[index] = _Bucket(number)
+        position = bisect_right(bucket.times, when)
+        bucket.times.insert(position, when)
+        bucket.rows.insert(position, (rsn, loot))
+        total = bucket.sums.setdefault(rsn, [0, 0])
+        total[0] += loot
+        total[1] += 1
+
+        for window, start in enumerate(self._starts):
+            if when >= start:
+                total = self._totals[window].setdefault(rsn, [0, 0])
+                total[0] += loot
+                total[1] += 1
+            elif number == self._cursors[window][0]:
+                self._cursors[window][1] += 1    # inserted before the window's first row
+
+    def add_rows(self, rows: Iterable[tuple[str, datetime, int | None]]):
+        """
+        Count stored (rsn, date, loot_big_int) rows
+        """
+        for rsn, date, loot in rows:
+            self.add(rsn, date.timestamp(), loot)
+
+    def advance(self, now: float | None = None):
+        """
+        Move every window's start to `now` minus its length
+        """
+        if now is None:
+            now = time.time()
+        for window, length in enumerate(self._lengths):
+            start = now - length
+            if start <= self._starts[window]:
+                continue
+            totals = self._totals[window]
+            cursor = self._cursors[window]
+            number = self._bucket_number(start)
+            if number - cursor[0] >= len(self._ring):
+                totals.clear()  # idle for longer than the ring
+            else:
+                # Buckets that are now entirely outside the window
+                while cursor[0] < number:
+                    bucket = self._bucket(cursor[0])
+                    if bucket is not None:
+                        if cursor[1] == 0:
+                            self._subtract_sums(totals, bucket.sums)
+                        else:
+                            self._subtract_rows(totals, bucket.rows[cursor[1]:])
+                    cursor[0] += 1
+                    cursor[1] = 0
+                # and the rows before the start in the bucket it is in
+                bucket = self._bucket(number)
+                if bucket is not None:
+                    end = bisect_left(bucket.times, start)
+                    self._subtract_rows(totals, bucket.rows[cursor[1]:end])
+                    cursor[1] = max(end, cursor[1])
+            self._cursors[window] = [number, cursor[1] if number == cursor[0] else 0]
+            self._starts[window] = start
+
+    @staticmethod
+    def _subtract_sums(totals: dict[str, list[int]], sums: dict[str, list[int]]):
+        for rsn, (loot, rows) in sums.items():
+            total = totals[rsn]
+            total[0] -= loot
+            total[1] -= rows
+            if not total[1]:
+                del totals[rsn]
+
+    @staticmethod
+    def _subtract_rows(totals: dict[str, list[int]], rows: list[tuple[str, int]]):
+        for rsn, loot in rows:
+            total = totals[rsn]
+            total[0] -= loot
+            total[1] -= 1
+            if not total[1]:
+                del totals[rsn]
+
+    def _index(self, window: str) -> int:
+        try:
+            return list(self.windows).index(window)
+        except ValueError:
+            raise KeyError(f"Unknown leaderboard window {window!r}, expected one of {list(self.windows)}")
+
+    def window(self, window: str) -> list[tuple[str, int]]:
+        """
+        (rsn, total) of everyone with rows in the window, in descending order
+        """
+        self.advance()
+        totals = self._totals[self._index(window)]
+        return sorted(
+            ((rsn, total[0]) for rsn, total in totals.items()),
+            key=itemgetter(1),
+            reverse=True
+        )
+
+    def top(self, window: str, n: int = 10) -> list[tuple[str, int]]:
+        self.advance()
+        totals = self._totals[self._index(window)]
+        return nlargest(n, ((rsn, total[0]) for rsn, total in totals.items()), key=itemgetter(1))
+
+    def total(self, rsn: str, window: str) -> int:
+        self.advance()
+        total = self._totals[self._index(window)].get(rsn)
+        return total[0] if total else 0
+
+    def snapshot(self, table: str) -> WindowLeaderboard:
+        """
+        Every window's totals, in the shape get_window_sums_db returns
+        """
+        self.advance()
+        totals: dict[str, list[int | None]] = {}
+        for window, window_totals in enumerate(self._totals):
+            for rsn, total in window_totals.items():
+                totals.setdefault(rsn, [None] * len(self.windows))[window] = total[0]
+        return WindowLeaderboard(
+            table=table,
+            as_of=datetime.now(timezone.utc),
+            windows=dict(self.windows),
+            totals={rsn: tuple(window_totals) for rsn, window_totals in totals.items()}
+        )
+
+
+class LiveLeaderboards:
+    """
+    A SlidingLeaderboard per loot table, warmed from the database on start
+    and fed every row the BatchWriter stores after that
+
+    Warm it before the writer starts, so no row is missed or counted twice.
+    """
+    def __init__(
+        self,
+        windows: dict[str, int] = LEADERBOARD_WINDOWS,
+        bucket_seconds: int = 60
+    ):
+        self.windows = windows
+        self.bucket_seconds = bucket_seconds
+        self.boards: dict[type, SlidingLeaderboard] = {
+            model: SlidingLeaderboard(windows, bucket_seconds) for model in loot_tables
+        }
+
+    def __getitem__(self, model) -> SlidingLeaderboard:
+        return self.boards[model]
+
+    def add_rows(self, model, rows: Iterable[tuple[str, datetime, int | None]]):
+        board = self.boards.get(model)
+        if board is not None:
+            board.add_rows(rows)
+
+    async def warm(self, async_session: async_sessionmaker):
+        """
+        Load the rows of the longest window from every loot table
+        """
+        since = datetime.now(timezone.utc) - timedelta(hours=max(self.windows.values()))
+        boards = {model: SlidingLeaderboard(self.windows, self.bucket_seconds) for model in loot_tables}
+        async with async_session() as session:
+            try:
+                for model, board in boards.items():
+                    result = await session.execute(
+                        select(model.rsn, model.date, model.loot_big_int)
+                        .where(model.date >= since)
+                        .order_by(model.date)
+                    )
+                    board.add_rows(result.all())
+                    logger.info(f"Warmed {model.__tablename__} leaderboard with {len(board)} rows")
+            except Exception as e:
+                logger.error(f"Failed to warm leaderboards from db: {e}")
+                await session.rollback()
+                return
+        self.boards = boards
+
+
+live_leaderboards = LiveLeaderboards()
+
+
+if __name__ == '__main__':
+    # Check the windows against summing every row, then time top-N
+    #   PYTHONPATH=src python -m db.live_leaderboard
+    import random
+
+    board = SlidingLeaderboard(bucket_seconds=60)
+    now = time.time()
+    rsns = [f"player {i}" for i in range(300)]
+    rows = sorted(
+        (now - random.uniform(0, 31 * 24 * 60 * 60), random.choice(rsns), random.randint(0, 10_000_000))
+        for _ in range(100_000)
+    )
+    start = time.perf_counter()
+    for when, rsn, loot in rows:
+        board.add(rsn, when, loot)
+    print(f"Added {len(rows):,} rows in {time.perf_counter() - start:.2f}s, {len(board):,} kept")
+
+    def brute_force(window: str, at: float) -> dict[str, int]:
+        since = at - board.windows[window] * 60 * 60
+        totals: dict[str, int] = {}
+        for when, rsn, loot in rows:
+            if when >= since:
+                totals[rsn] = totals.get(rsn, 0) + loot
+        return totals
+
+    mismatches = 0
+    for window in board.windows:
+        at = time.time()
+        board.advance(at)
+        got = dict(board._totals[board._index(window)])
+        expected = brute_force(window, at)
+        if {rsn: total[0] for rsn, total in got.items()} != expected:
+            mismatches += 1
+            print(f"{window}: totals differ from the rows")
+    print(f"{len(board.windows)} windows checked, {mismatches} mismatches")
+
+    rounds = 2000
+    for window in ("1h", "30d"):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            board.top(window, 10)
+        elapsed = time.perf_counter() - start
+        print(f"top 10 {window}: {elapsed / rounds * 1e6:.1f} us")
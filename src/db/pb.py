@@ -8,6 +8,7 @@ from sqlalchemy import (
 from sqlalchemy.sql.functions import sum
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from config.logger_config import get_logger
+from webhooks.webhooks import GameChatRecord
 from datetime import datetime, timedelta
 
 logger = get_logger(__name__)
@@ -45,17 +46,19 @@ async def get_all_personal_best_db(
 
 async def insert_personal_best_db(
     async_session: async_sessionmaker,
-    data: dict
+    record: GameChatRecord
 ):
     async with async_session() as session:
         try:
-            logger.info(f"Inserting personal best for {data.get('rsn')} to db")
+            logger.info(f"Inserting personal best for {record.rsn} to db")
             new_drop = PersonalBest(
-                rsn=data.get('rsn'),
-                duration=data.get('duration')
+                rsn=record.rsn,
+                boss=record.boss,
+                duration=record.duration,
+                message_id=record.message_id
             )
             session.add(new_drop)
             await session.commit()
         except Exception as e:
-            logger.error(f"Failed to add personal best for {data.get('rsn')} to db: {e}")
+            logger.error(f"Failed to add personal best for {record.rsn} to db: {e}")
             await session.rollback()
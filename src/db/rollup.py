@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Iterable
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.db_init import create_tables, engine, rollup_tables
+from config.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Rollup table by loot table name, for raw SQL
+HOURLY_TABLES = {
+    model.__tablename__: hourly.__tablename__
+    for model, hourly in rollup_tables.items()
+}
+
+# Start of a row's hour in UTC, whatever the session's time zone
+HOUR_SQL = "to_timestamp(floor(extract(epoch FROM date) / 3600) * 3600)"
+
+
+def hour_of(date: datetime) -> datetime:
+    """
+    Start of the UTC hour date falls in
+    """
+    return date.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_sql(table: str, source: str) -> str:
+    """
+    SQL adding the rsn, date and loot_big_int rows of source to table's rollup
+
+    source is a table, or the name of a CTE returning stored rows.
+    """
+    hourly = HOURLY_TABLES[table]
+    return (
+        f"INSERT INTO {hourly} (rsn, hour, loot_big_int, row_count) "
+        f"SELECT rsn, {HOUR_SQL}, coalesce(sum(loot_big_int), 0), count(*) "
+        f"FROM {source} WHERE rsn IS NOT NULL GROUP BY 1, 2 "
+        "ON CONFLICT (rsn, hour) DO UPDATE SET "
+        f"loot_big_int = {hourly}.loot_big_int + excluded.loot_big_int, "
+        f"row_count = {hourly}.row_count + excluded.row_count"
+    )
+
+
+async def add_to_rollup(
+    session: AsyncSession,
+    model,
+    rows: Iterable[tuple[str, datetime, int | None]]
+):
+    """
+    Add stored (rsn, date, loot_big_int) rows to the model's hourly rollup
+
+    Call it in the transaction that stored the rows, with only the rows that
+    were inserted, so the rollup never counts a row that was not.
+    """
+    totals: dict[tuple[str, datetime], list[int]] = {}
+    for rsn, date, loot_big_int in rows:
+        if rsn is None:
+            continue
+        total = totals.setdefault((rsn, hour_of(date)), [0, 0])
+        total[0] += loot_big_int or 0
+        total[1] += 1
+    if not totals:
+        return
+    hourly = rollup_tables[model]
+    stmt = insert(hourly).values([
+        {"rsn": rsn, "hour": hour, "loot_big_int": loot_big_int, "row_count": row_count}
+        for (rsn, hour), (loot_big_int, row_count) in totals.items()
+    ])
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=["rsn", "hour"],
+        set_={
+            "loot_big_int": hourly.loot_big_int + stmt.excluded.loot_big_int,
+            "row_count": hourly.row_count + stmt.excluded.row_count
+        }
+    ))
+
+
+async def rebuild_rollups(only_empty: bool = False):
+    """
+    Recompute every hourly rollup from its loot table
+
+    Parameters
+    ----------
+    only_empty: bool
+        Only rebuild rollups that are empty while their loot table is not,
+        e.g. right after they were created on an existing database.
+    """
+    for model, hourly in rollup_tables.items():
+        table = model.__tablename__
+        try:
+            async with engine.begin() as conn:
+                if only_empty:
+                    needs_rebuild = await conn.scalar(text(
+                        f"SELECT NOT EXISTS (SELECT 1 FROM {hourly.__tablename__}) "
+                        f"AND EXISTS (SELECT 1 FROM {table})"
+                    ))
+                    if not needs_rebuild:
+                        continue
+                # Writers wait for the rebuild, no row is missed or counted twice
+                await conn.execute(text(f"LOCK TABLE {table} IN SHARE MODE"))
+                await conn.execute(text(f"TRUNCATE {hourly.__tablename__}"))
+                result = await conn.execute(text(rollup_sql(table, table)))
+            logger.info(f"Rebuilt {hourly.__tablename__}: {result.rowcount} player hours")
+        except Exception as e:
+            logger.error(f"Failed to rebuild {hourly.__tablename__}: {e}")
+
+
+if __name__ == '__main__':
+    # One-off rebuild of every rollup, e.g. after editing loot tables by hand
+    #   PYTHONPATH=src python -m db.rollup
+    async def main():
+        await create_tables()
+        await rebuild_rollups()
+        await engine.dispose()
+
+    asyncio.run(main())
@@ -3,14 +3,123 @@ from db.db_init import (
 )
 from sqlalchemy import (
     update,
-    select
+    select,
+    func
 )
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from config.logger_config import get_logger
+from datetime import datetime, timezone
+from typing import Callable
 
 logger = get_logger(__name__)
 
 
+class StreamerCache:
+    """
+    Process-local copy of the Streamer table, keyed by lowercase name.
+
+    Loaded once at startup and updated write-through after every committed
+    streamer write, so the pollers can ask whether a streamer was live, or
+    for their profile picture, without a DB round trip. Postgres stays the
+    durable copy; the cache is rebuilt from it on restart.
+    """
+    def __init__(self):
+        self._streamers: dict[str, dict] = {}
+        self._listeners: list[Callable[[dict], None]] = []
+
+    def add_listener(self, callback: Callable[[dict], None]):
+        """
+        Call callback(streamer) whenever a streamer is added or goes live/offline
+        """
+        self._listeners.append(callback)
+
+    async def load(self, async_session: async_sessionmaker):
+        async with async_session() as session:
+            result = await session.execute(select(Streamer))
+            self._streamers = {
+                streamer.name.lower(): {
+                    "name": streamer.name,
+                    "title": streamer.title,
+                    "is_live": streamer.is_live,
+                    "stream_id": streamer.stream_id,
+                    "start_time": streamer.start_time,
+                    "video_thumbnail": streamer.video_thumbnail,
+                    "profile_pic": streamer.profile_pic,
+                    "url": streamer.url
+                }
+                for streamer in result.scalars()
+            }
+        logger.info(f"Loaded {len(self._streamers)} streamers into cache")
+
+    def update(self, data: dict):
+        """
+        Apply a committed row, with the table's defaults for new streamers
+        """
+        key = data['name'].lower()
+        streamer = self._streamers.get(key)
+        was_live = streamer["is_live"] if streamer else None
+        if streamer is None:
+            streamer = {
+                "title": "N/A",
+                "is_live": False,
+                "stream_id": -1,
+                "start_time": datetime.now(timezone.utc),
+                "video_thumbnail": "N/A",
+                "profile_pic": "N/A",
+                "url": "N/A"
+            }
+            self._streamers[key] = streamer
+        streamer.update(data)
+        if streamer["is_live"] != was_live:
+            for callback in self._listeners:
+                callback(streamer)
+
+    def get(self, name: str) -> dict | None:
+        return self._streamers.get(name.lower())
+
+    def is_live(self, name: str) -> bool:
+        streamer = self.get(name)
+        return streamer["is_live"] if streamer else False
+
+    def profile_pic(self, name: str) -> str:
+        streamer = self.get(name)
+        return streamer["profile_pic"] if streamer else "N/A"
+
+    def all(self) -> list[dict]:
+        return list(self._streamers.values())
+
+    def get_live_and_offline(self) -> tuple[list[dict], list[dict]]:
+        """
+        Same result as get_live_and_offline_streamers_db, without the query
+        """
+        live: list[dict] = []
+        not_live: list[dict] = []
+        for streamer in self._streamers.values():
+            data = {
+                "name": streamer["name"],
+                "start_time": streamer["start_time"],
+                "url": streamer["url"]
+            }
+            (live if streamer["is_live"] else not_live).append(data)
+        live.sort(key=lambda v: v["name"].lower())
+        not_live.sort(key=lambda v: v["name"].lower())
+        return (live, not_live)
+
+
+streamer_cache = StreamerCache()
+
+
+def name_equals(name: str):
+    """
+    Case-insensitive name match that can use the lower(name) index.
+
+    ILIKE cannot be served by a btree index and also treats _ and % in
+    names as wildcards.
+    """
+    return func.lower(Streamer.name) == name.lower()
+
+
 ##########################
 ###### Streamer table
 ##########################
@@ -32,6 +141,7 @@ async def add_streamer_db(
             )
             session.add(new_streamer)
             await session.commit()
+            streamer_cache.update(data)
         except Exception as e:
             logger.error(f"Failed adding {data.get('name', "")} to db: {e}")
             await session.rollback()
@@ -43,16 +153,30 @@ async def update_streamer_db(async_session: async_sessionmaker, data: dict):
             logger.info(f"Updating {data.get('name', "")} to db")
             stmt = (
                 update(Streamer)
-                .where(Streamer.name.ilike(data.get('name')))
+                .where(name_equals(data.get('name')))
                 .values(**data)
             )
             await session.execute(stmt)
             await session.commit()
+            streamer_cache.update(data)
         except Exception as e:
             logger.error(f"Failed updating {data.get('name', "")} to db: {e}")
             await session.rollback()
 
 
+def upsert_streamers_stmt(rows: list[dict]):
+    """
+    INSERT ... ON CONFLICT (lower(name)) DO UPDATE for rows with the same keys
+
+    Only the columns present in the rows are updated on conflict.
+    """
+    stmt = insert(Streamer).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[func.lower(Streamer.name)],
+        set_={key: stmt.excluded[key] for key in rows[0]}
+    )
+
+
 # Add if new entry, else update
 async def add_or_update_streamer_db(
     async_session: async_sessionmaker,
@@ -60,21 +184,44 @@ async def add_or_update_streamer_db(
 ):
     async with async_session() as session:
         try:
-            stmt = (
-                select(Streamer)
-                .where(Streamer.name.ilike(data.get('name')))
-            )
-            result = await session.execute(stmt)
-            streamer = result.scalar()
-            if streamer:
-                await update_streamer_db(async_session, data)
-            else:
-                await add_streamer_db(async_session, data)
+            await session.execute(upsert_streamers_stmt([data]))
+            await session.commit()
+            streamer_cache.update(data)
         except Exception as e:
             logger.error(f"Failed add_or_update_streamer_db: {e}")
             await session.rollback()
 
 
+async def upsert_streamers_db(
+    async_session: async_sessionmaker,
+    rows: list[dict]
+):
+    """
+    Add or update a whole polling cycle's streamers in one transaction
+
+    Rows are grouped by the columns they set, one multi-row upsert per group.
+    Within a group the last row for a streamer wins, Postgres refuses to
+    update the same row twice in one statement.
+    """
+    if not rows:
+        return
+    groups: dict[tuple, dict[str, dict]] = {}
+    for data in rows:
+        group = groups.setdefault(tuple(sorted(data)), {})
+        group[data['name'].lower()] = data
+    async with async_session() as session:
+        try:
+            logger.info(f"Upserting {len(rows)} streamers to db")
+            for group in groups.values():
+                await session.execute(upsert_streamers_stmt(list(group.values())))
+            await session.commit()
+            for data in rows:
+                streamer_cache.update(data)
+        except Exception as e:
+            logger.error(f"Failed upsert_streamers_db: {e}")
+            await session.rollback()
+
+
 async def get_streamer_db(
     async_session: async_sessionmaker,
     data: dict
@@ -83,7 +230,7 @@ async def get_streamer_db(
         try:
             stmt = (
                 select(Streamer)
-                .where(Streamer.name.ilike(data.get('name')))
+                .where(name_equals(data.get('name')))
             )
             result = await session.execute(stmt)
             streamer = result.scalars().first
@@ -148,7 +295,7 @@ async def get_is_live_status_db(async_session: async_sessionmaker, data: dict):
         try:
             stmt = (
                 select(Streamer)
-                .where(Streamer.name.ilike(data.get('name')))
+                .where(name_equals(data.get('name')))
             )
             result = await session.execute(stmt)
             streamer = result.scalar()
@@ -169,7 +316,7 @@ async def get_twitch_profile_pic(
         try:
             stmt = (
                 select(Streamer)
-                .where(Streamer.name.ilike(data.get('name')))
+                .where(name_equals(data.get('name')))
             )
             result = await session.execute(stmt)
             streamer = result.scalar()
@@ -0,0 +1,120 @@
+import asyncio
+from contextlib import asynccontextmanager
+from playwright.async_api import (
+    async_playwright,
+    Browser,
+    Page,
+    Playwright,
+    Error as PlaywrightError
+)
+from config.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class BrowserPool:
+    """
+    One long-lived headless Chromium shared by every Kick request.
+
+    The browser is launched on first use and reused for the lifetime of the
+    bot. Pages, each in their own context, are leased with `lease()` and
+    returned to the pool afterwards, so scraping a streamer costs one page
+    navigation instead of a browser launch.
+
+    Parameters
+    ---------
+    size: int
+        Maximum number of pages in use at the same time.
+
+    headless: bool
+        Launch Chromium without a window.
+    """
+    def __init__(self, size: int = 4, headless: bool = True):
+        self.size = size
+        self.headless = headless
+        self._playwright: Playwright | None = None
+        self._browser: Browser | None = None
+        self._idle_pages: list[Page] = []
+        self._semaphore = asyncio.Semaphore(size)
+        self._launch_lock = asyncio.Lock()
+        self._generation = 0    # bumped on every (re)launch
+
+    def is_healthy(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def start(self):
+        """
+        Launch the browser if it is not running, or relaunch it after a crash
+        """
+        async with self._launch_lock:
+            if self.is_healthy():
+                return
+            if self._browser is not None:
+                logger.warning("Kick browser is disconnected, relaunching")
+            await self._shutdown()
+            logger.info(f"Launching Kick browser pool with {self.size} pages")
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(
+                headless=self.headless
+            )
+            self._generation += 1
+
+    async def close(self):
+        async with self._launch_lock:
+            await self._shutdown()
+
+    async def _shutdown(self):
+        self._idle_pages.clear()
+        try:
+            if self._browser is not None:
+                await self._browser.close()
+        except Exception as e:
+            logger.error(f"Failed to close Kick browser: {e}")
+        try:
+            if self._playwright is not None:
+                await self._playwright.stop()
+        except Exception as e:
+            logger.error(f"Failed to stop playwright: {e}")
+        self._browser = None
+        self._playwright = None
+
+    async def _new_page(self) -> Page:
+        context = await self._browser.new_context()
+        return await context.new_page()
+
+    async def _discard_page(self, page: Page):
+        try:
+            await page.context.close()
+        except Exception:
+            pass    # browser may already be gone
+
+    @asynccontextmanager
+    async def lease(self):
+        """
+        Borrow a page from the pool
+
+        Waits while `size` pages are already leased. A page that raised a
+        Playwright error, or belongs to a browser that has since been
+        relaunched, is discarded instead of being returned to the pool.
+        """
+        async with self._semaphore:
+            if not self.is_healthy():
+                await self.start()
+            generation = self._generation
+            page = self._idle_pages.pop() if self._idle_pages else await self._new_page()
+            reusable = True
+            try:
+                yield page
+            except PlaywrightError:
+                reusable = False
+                raise
+            finally:
+                if (
+                    reusable
+                    and generation == self._generation
+                    and self.is_healthy()
+                    and not page.is_closed()
+                ):
+                    self._idle_pages.append(page)
+                else:
+                    await self._discard_page(page)
@@ -1,11 +1,13 @@
 import asyncio
-from playwright.async_api import async_playwright, Playwright
+import aiohttp
+from collections import Counter
+from kick.browser_pool import BrowserPool
 from db.db_init import (
     async_session
 )
 from db.streamer import (
-    add_or_update_streamer_db,
-    get_is_live_status_db,
+    streamer_cache,
+    upsert_streamers_db,
 )
 from utils.utils import (
     send_live_notification,
@@ -19,6 +21,109 @@ from rich import print
 
 logger = get_logger(__name__)
 
+KICK_CHANNEL_URL = "https://kick.com/api/v2/channels/{streamer}/"
+
+# Markers of an anti-bot interstitial instead of the channel JSON
+CHALLENGE_STATUSES = {403, 429, 503}
+CHALLENGE_MARKERS = (
+    "Just a moment",
+    "challenge-platform",
+    "cf-chl",
+    "Security Checkpoint",
+)
+
+# Request headers copied from the browser, cookies are copied separately
+BROWSER_HEADERS = (
+    "user-agent",
+    "accept-language",
+    "sec-ch-ua",
+    "sec-ch-ua-mobile",
+    "sec-ch-ua-platform",
+)
+
+
+class KickFetcher:
+    """
+    Fetch Kick channel JSON over pooled HTTP, with Playwright as a fallback.
+
+    Requests go through one aiohttp session first, using the cookies and
+    headers captured from the last successful browser request. Only when Kick
+    answers with an anti-bot challenge is a page leased from the browser pool.
+    `tier_counts` records which tier ("http", "browser" or "failed") served
+    each request.
+    """
+    def __init__(self, pool: BrowserPool):
+        self.pool = pool
+        self.tier_counts: Counter = Counter()
+        self._session: aiohttp.ClientSession | None = None
+        self._headers = {"Accept": "application/json"}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=10),
+                timeout=aiohttp.ClientTimeout(total=15)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch_channel(self, streamer: str) -> dict:
+        url = KICK_CHANNEL_URL.format(streamer=streamer)
+        try:
+            data = await self._fetch_http(url)
+            if data is not None:
+                self.tier_counts["http"] += 1
+                return data
+            logger.info(f"Kick challenge for {streamer}, falling back to browser")
+            data = await self._fetch_browser(url)
+            self.tier_counts["browser"] += 1
+            return data
+        except Exception:
+            self.tier_counts["failed"] += 1
+            raise
+
+    async def _fetch_http(self, url: str) -> dict | None:
+        """
+        Return the channel JSON, or None if the response is a challenge
+        """
+        session = self._get_session()
+        async with session.get(url, headers=self._headers) as resp:
+            body = await resp.text()
+            content_type = resp.headers.get("Content-Type", "")
+            if (
+                resp.status in CHALLENGE_STATUSES
+                or "application/json" not in content_type
+                or any(marker in body for marker in CHALLENGE_MARKERS)
+            ):
+                return None
+            return await resp.json(content_type=None)
+
+    async def _fetch_browser(self, url: str) -> dict:
+        async with self.pool.lease() as page:
+            r = await page.goto(url)
+            data = await r.json()
+            # Reuse the browser's clearance for the next HTTP requests
+            request_headers = await r.request.all_headers()
+            cookies = await page.context.cookies(url)
+        self._headers = {"Accept": "application/json"}
+        for name in BROWSER_HEADERS:
+            if name in request_headers:
+                self._headers[name] = request_headers[name]
+        self._get_session().cookie_jar.update_cookies(
+            {cookie["name"]: cookie["value"] for cookie in cookies}
+        )
+        return data
+
+
+# Shared by every Kick request, launched on first use and closed on shutdown
+browser_pool = BrowserPool(size=4)
+kick_fetcher = KickFetcher(browser_pool)
+
+
 def parse_json(data):
     user = data.get("user", {})
     livestream = data.get("livestream", {})
@@ -35,34 +140,35 @@ def parse_json(data):
     return parsed_json
 
 
-async def get_kick_stream_status(client: Bot, playwright: Playwright, streamer: str):
+async def get_kick_stream_status(
+    client: Bot,
+    fetcher: KickFetcher,
+    streamer: str
+) -> dict | None:
     """
     Webscrape Kick's backend API for information for one streamer
 
+    Returns the streamer's row to upsert, None if the request failed.
+
     Parameters
     ---------
     client: discord.ext.commands.Bot
         Discord bot instance, used to send embedding to discord channel.
 
+    fetcher: KickFetcher
+        Tiered fetcher, plain HTTP first and the browser pool on a challenge.
+
     streamer: str
         The name of the Kick streamer (case-insensitive)
     """
     logger.info(f"Getting kick status for {streamer}")
     try:
         # Webscrape
-        browser = await playwright.chromium.launch(headless=False)
-        page = await browser.new_page()
-        url = f'https://kick.com/api/v2/channels/{streamer}/'
-        r = await page.goto(url)
-        data = await r.json()
+        data = await fetcher.fetch_channel(streamer)
         parsed_data = parse_json(data)    # only save important fields
-        await browser.close()
 
         # Verify online/offline status of streamer
-        was_is_live = await get_is_live_status_db(
-                        async_session,
-                        parsed_data
-                    )
+        was_is_live = streamer_cache.is_live(parsed_data['name'])
         current_is_live = parsed_data['is_live']
 
         # Send embedding to channel
@@ -73,9 +179,10 @@ async def get_kick_stream_status(client: Bot, playwright: Playwright, streamer:
         elif was_is_live and not current_is_live:
             parsed_data['start_time'] = datetime.now(timezone.utc)
 
-        await add_or_update_streamer_db(async_session, parsed_data)
+        return parsed_data
     except Exception as e:
         logger.error(f"Failed to retrieve status for {streamer}: {e}")
+        return None
 
 
 async def get_all_kick_stream_status(client: Bot, streamers: list[str]):
@@ -92,17 +199,23 @@ async def get_all_kick_stream_status(client: Bot, streamers: list[str]):
 
     """
     logger.info("Getting all Kick streams statuses...")
-    async with async_playwright() as p:
-        tasks = []
-        for streamer in streamers:
-            tasks.append(asyncio.create_task(get_kick_stream_status(
-                    client=client,
-                    playwright=p,
-                    streamer=streamer
-                )
+    before = kick_fetcher.tier_counts.copy()
+    tasks = []
+    for streamer in streamers:
+        tasks.append(asyncio.create_task(get_kick_stream_status(
+                client=client,
+                fetcher=kick_fetcher,
+                streamer=streamer
             )
         )
-        await asyncio.gather(*tasks)
+    )
+    results = await asyncio.gather(*tasks)
+    await upsert_streamers_db(async_session, [data for data in results if data])
+    cycle = kick_fetcher.tier_counts - before
+    logger.info(
+        f"Kick tiers this cycle - http: {cycle['http']}, "
+        f"browser: {cycle['browser']}, failed: {cycle['failed']}"
+    )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,239 @@
+import json
+import os
+import time
+from collections import deque
+from config.logger_config import get_logger
+from prices.prices import (
+    open_prices_session,
+    price_config,
+    save_json
+)
+
+logger = get_logger(__name__)
+
+
+class ItemMatcher:
+    """
+    Aho-Corasick automaton over lowercase item names.
+
+    `longest` reads a text once and returns the id of the longest item name
+    in it that starts and ends on a word boundary, so "Dragon bones" wins
+    over "Bones" and "Bow" does not match inside "Twisted bowl". The cost
+    depends on the text's length, not on the number of items.
+    """
+    def __init__(self, names: dict[str, int]):
+        # Per node: child by character, fail link, (length, item id) if a
+        # name ends here, and the nearest node on the fail chain where one does
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._name: list[tuple[int, int] | None] = [None]
+        self._link: list[int] = [0]
+
+        for name, item_id in names.items():
+            node = 0
+            for char in name:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._name.append(None)
+                    self._link.append(0)
+                node = next_node
+            self._name[node] = (len(name), item_id)
+
+        # Breadth first, so every fail target is finished before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                fail = target if target != child else 0
+                self._fail[child] = fail
+                self._link[child] = fail if self._name[fail] else self._link[fail]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def longest(self, text: str) -> int | None:
+        text = text.lower()
+        goto = self._goto
+        fail = self._fail
+        names = self._name
+        link = self._link
+        size = len(text)
+        best_length = 0
+        best_id = None
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            # Names ending here, longest first, until one sits on word boundaries
+            match = node if names[node] else link[node]
+            while match:
+                length, item_id = names[match]
+                if length <= best_length:
+                    break
+                start = end - length
+                if (
+                    (start == 0 or not text[start - 1].isalnum())
+                    and (end == size or not text[end].isalnum())
+                ):
+                    best_length = length
+                    best_id = item_id
+                    break
+                match = link[match]
+        return best_id
+
+
+class ItemCatalog:
+    """
+    Every item's id by name, from the OSRS wiki's /mapping endpoint.
+
+    The mapping is saved to `cache_file` and loaded on start, and only
+    downloaded when it is missing or older than `max_age` seconds; new
+    items are added to the game with weekly updates.
+
+    Parameters
+    ---------
+    base_url: str
+        API root, e.g. https://prices.runescape.wiki/api/v1/osrs
+
+    cache_file: str
+        Where the downloaded mapping is saved.
+
+    max_age: float
+        Seconds before a saved mapping is downloaded again.
+    """
+    def __init__(
+        self,
+        base_url: str = price_config.PRICES_BASE_URL,
+        cache_file: str = os.path.join(price_config.PRICES_CACHE_DIR, "mapping.json"),
+        max_age: float = 24 * 60 * 60
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.cache_file = cache_file
+        self.max_age = max_age
+        self.fetched_at: float | None = None
+        self._ids: dict[str, int] = {}
+        self._matcher = ItemMatcher({})
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _set_mapping(self, mapping: list[dict], fetched_at: float):
+        ids: dict[str, int] = {}
+        for item in sorted(mapping, key=lambda item: item['id']):
+            # A few names are shared, e.g. by noted variants, keep the lowest id
+            ids.setdefault(item['name'].lower(), item['id'])
+        # Build first and swap, lookups never see a half built index
+        matcher = ItemMatcher(ids)
+        self._ids = ids
+        self._matcher = matcher
+        self.fetched_at = fetched_at
+
+    def get_id(self, name: str) -> int | None:
+        """
+        Exact, case-insensitive name lookup
+        """
+        return self._ids.get(name.strip().lower())
+
+    def find_id(self, text: str) -> int | None:
+        """
+        The id of the item named in text
+
+        text may be just the name, or a message with the name in it, in
+        which case the longest item name found wins.
+        """
+        item_id = self.get_id(text)
+        if item_id is None:
+            item_id = self._matcher.longest(text)
+        return item_id
+
+    def load(self):
+        """
+        Load the mapping saved by the last run, if there is one
+        """
+        try:
+            with open(self.cache_file, 'r') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load saved item mapping: {e}")
+            return
+        self._set_mapping(saved['mapping'], saved['fetched_at'])
+        logger.info(f"Loaded {len(self._ids)} item names")
+
+    async def refresh(self, force: bool = False):
+        """
+        Download /mapping if the saved copy is missing or too old
+        """
+        if (
+            not force
+            and self.fetched_at is not None
+            and time.time() - self.fetched_at < self.max_age
+        ):
+            return
+        try:
+            session = await open_prices_session()
+            async with session.get(f"{self.base_url}/mapping") as resp:
+                resp.raise_for_status()
+                mapping = await resp.json()
+        except Exception as e:
+            logger.error(f"Failed to refresh item mapping: {e}")
+            return
+        self._set_mapping(mapping, time.time())
+        logger.info(f"Refreshed {len(self._ids)} item names")
+        try:
+            save_json(self.cache_file, {"fetched_at": self.fetched_at, "mapping": [
+                {"id": item['id'], "name": item['name']} for item in mapping
+            ]})
+        except OSError as e:
+            logger.error(f"Failed to save item mapping: {e}")
+
+
+item_catalog = ItemCatalog()
+
+
+if __name__ == '__main__':
+    # Time find_id on a catalog of the saved mapping's size
+    #   PYTHONPATH=src python -m prices.items
+    import random
+    import string
+
+    item_catalog.load()
+    if not len(item_catalog):
+        print("No saved mapping, using generated names")
+        words = ["".join(random.choices(string.ascii_lowercase, k=random.randint(3, 9)))
+                 for _ in range(3000)]
+        item_catalog._set_mapping([
+            {"id": i, "name": " ".join(random.sample(words, random.randint(1, 3)))}
+            for i in range(4000)
+        ] + [{"id": 13652, "name": "Dragon claws"}, {"id": 536, "name": "Dragon bones"},
+             {"id": 526, "name": "Bones"}], time.time())
+
+    messages = [
+        "Dragon claws",
+        "Some Player received a drop: Dragon claws",
+        "Some Player received a drop: Dragon bones",
+        "Bones to peaches received a drop: Bones",
+        "Some Player received a drop: Nothing that exists",
+    ]
+    for message in messages:
+        print(f"{message!r} -> {item_catalog.find_id(message)}")
+
+    rounds = 20_000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            item_catalog.find_id(message)
+    elapsed = time.perf_counter() - start
+    print(f"{len(item_catalog)} items, {len(item_catalog._matcher)} automaton states: "
+          f"{rounds * len(messages) / elapsed:,.0f} lookups/s")
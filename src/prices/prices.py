@@ -0,0 +1,185 @@
+import asyncio
+import json
+import os
+import time
+import aiohttp
+from config.config import PriceConfig
+from config.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+price_config = PriceConfig(".env")
+
+# The wiki asks every client to identify itself
+HEADERS = {
+    'User-Agent': 'Drops Tracker for discord server',
+}
+
+
+# Shared by the price snapshot and the item catalog, closed on shutdown
+prices_session: aiohttp.ClientSession | None = None
+
+
+async def open_prices_session() -> aiohttp.ClientSession:
+    global prices_session
+    if prices_session is None or prices_session.closed:
+        prices_session = aiohttp.ClientSession(
+            headers=HEADERS,
+            timeout=aiohttp.ClientTimeout(total=30, connect=5)
+        )
+    return prices_session
+
+
+async def close_prices_session():
+    global prices_session
+    if prices_session is not None:
+        await prices_session.close()
+        prices_session = None
+
+
+def save_json(path: str, data):
+    """
+    Write data to path through a temporary file, never leaving half a file
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_file = path + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_file, path)
+
+
+class PriceService:
+    """
+    Every item's price from the OSRS wiki's /latest endpoint, kept in memory.
+
+    `refresh` downloads the whole snapshot, one request for all items, and
+    is run on a schedule by the bot. Lookups never touch the network, so a
+    drop is valued with whatever snapshot is current. The last snapshot is
+    saved to `cache_file` and loaded on start, so prices are available
+    before the first refresh.
+
+    Parameters
+    ---------
+    base_url: str
+        API root, e.g. https://prices.runescape.wiki/api/v1/osrs. Point it
+        at a local server for testing.
+
+    cache_file: str
+        Where the last snapshot is saved.
+    """
+    def __init__(
+        self,
+        base_url: str = price_config.PRICES_BASE_URL,
+        cache_file: str = os.path.join(price_config.PRICES_CACHE_DIR, "latest.json")
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.cache_file = cache_file
+        self._prices: dict[int, int] = {}
+        self.fetched_at: float | None = None    # unix time of the snapshot
+
+    def get_price(self, item_id: int | str) -> int | None:
+        """
+        The item's instant-sell (low) price, None if the snapshot has none
+        """
+        return self._prices.get(int(item_id))
+
+    def age(self) -> float | None:
+        """
+        Seconds since the snapshot was fetched, None before the first one
+        """
+        if self.fetched_at is None:
+            return None
+        return time.time() - self.fetched_at
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    def _set_snapshot(self, data: dict, fetched_at: float):
+        prices = {}
+        for item_id, entry in data.items():
+            # Items that have only traded one way still get a price
+            price = entry.get('low') or entry.get('high')
+            if price:
+                prices[int(item_id)] = price
+        self._prices = prices
+        self.fetched_at = fetched_at
+
+    async def refresh(self):
+        """
+        Replace the snapshot with a fresh /latest and save it to disk
+
+        On failure the current snapshot is kept.
+        """
+        try:
+            session = await open_prices_session()
+            async with session.get(f"{self.base_url}/latest") as resp:
+                resp.raise_for_status()
+                data = await resp.json()
+        except Exception as e:
+            logger.error(f"Failed to refresh item prices, snapshot is {self.age()}s old: {e}")
+            return
+        self._set_snapshot(data['data'], time.time())
+        logger.info(f"Refreshed {len(self._prices)} item prices")
+        try:
+            self.save()
+        except OSError as e:
+            logger.error(f"Failed to save item prices: {e}")
+
+    def save(self):
+        save_json(self.cache_file, {"fetched_at": self.fetched_at, "prices": self._prices})
+
+    def load(self):
+        """
+        Load the snapshot saved by the last run, if there is one
+        """
+        try:
+            with open(self.cache_file, 'r') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load saved item prices: {e}")
+            return
+        self._prices = {int(item_id): price for item_id, price in saved['prices'].items()}
+        self.fetched_at = saved['fetched_at']
+        logger.info(f"Loaded {len(self._prices)} item prices, {self.age():.0f}s old")
+
+
+price_service = PriceService()
+
+
+if __name__ == '__main__':
+    # Refresh against a local fake price server and read the snapshot back
+    #   PYTHONPATH=src python -m prices.prices
+    import tempfile
+    from aiohttp import web
+
+    async def latest(request: web.Request) -> web.Response:
+        return web.json_response({"data": {
+            "13652": {"high": 41_000_000, "highTime": 0, "low": 40_500_000, "lowTime": 0},
+            "21079": {"high": 9_000_000, "highTime": 0, "low": None, "lowTime": None},
+        }})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/latest", latest)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 8765).start()
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache_file = os.path.join(directory, "latest.json")
+            service = PriceService("http://127.0.0.1:8765", cache_file)
+            await service.refresh()
+            await close_prices_session()
+            print("Dragon claws:", service.get_price(13652))
+            print("Arcane prayer scroll:", service.get_price("21079"))
+
+            warm = PriceService("http://127.0.0.1:8765", cache_file)
+            warm.load()
+            print(f"Warm start: {len(warm)} prices, {warm.age():.1f}s old")
+        await runner.cleanup()
+
+    asyncio.run(run())
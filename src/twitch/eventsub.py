@@ -0,0 +1,352 @@
+import asyncio
+import hashlib
+import hmac
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+import aiohttp
+from aiohttp import web
+from config.config import TwitchConfig
+from config.logger_config import get_logger
+from twitch.twitch import (
+    TWITCH_CLIENT_ID,
+    TWITCH_CLIENT_SECRET,
+    get_helix_all,
+    get_helix_headers,
+    open_twitch_session
+)
+from utils.utils import RecentIds, read_streamers
+
+logger = get_logger(__name__)
+
+twitch_config = TwitchConfig(".env")
+
+SUBSCRIPTION_TYPES = ("stream.online", "stream.offline")
+
+# Twitch-Eventsub-Message-* headers used by the webhook transport
+HEADER_ID = "Twitch-Eventsub-Message-Id"
+HEADER_TIMESTAMP = "Twitch-Eventsub-Message-Timestamp"
+HEADER_SIGNATURE = "Twitch-Eventsub-Message-Signature"
+HEADER_TYPE = "Twitch-Eventsub-Message-Type"
+
+# Notifications older than this are rejected as replays
+MAX_MESSAGE_AGE = timedelta(minutes=10)
+
+EventHandler = Callable[[str, dict], Awaitable[None]]
+
+
+def verify_signature(
+    secret: str,
+    message_id: str,
+    timestamp: str,
+    body: bytes,
+    signature: str
+) -> bool:
+    """
+    Check a webhook notification's Twitch-Eventsub-Message-Signature header
+
+    The signature is "sha256=" followed by the hex HMAC-SHA256 of the message
+    id, timestamp and raw body, keyed with the subscription secret.
+    """
+    message = message_id.encode() + timestamp.encode() + body
+    expected = "sha256=" + hmac.new(
+        secret.encode(), message, hashlib.sha256
+    ).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
+
+class EventSubManager:
+    """
+    Subscribe to stream.online and stream.offline for every tracked streamer
+    and pass each notification to `on_event(event_type, event)`.
+
+    Parameters
+    ---------
+    on_event: Callable[[str, dict], Awaitable[None]]
+        Called with the subscription type and the notification's event object.
+
+    streamers_file: str
+        File with one Twitch login per line.
+
+    transport: str
+        "websocket" (no public endpoint needed) or "webhook" (requires
+        TWITCH_EVENTSUB_CALLBACK_URL and TWITCH_EVENTSUB_SECRET).
+    """
+    def __init__(
+        self,
+        on_event: EventHandler,
+        streamers_file: str,
+        transport: str = "websocket",
+        ws_url: str = twitch_config.TWITCH_EVENTSUB_WS_URL,
+        subscriptions_url: str = twitch_config.TWITCH_EVENTSUB_SUBSCRIPTIONS_URL,
+        secret: str = twitch_config.TWITCH_EVENTSUB_SECRET,
+        callback_url: str = twitch_config.TWITCH_EVENTSUB_CALLBACK_URL,
+        port: int = int(twitch_config.TWITCH_EVENTSUB_PORT)
+    ):
+        if transport not in ("websocket", "webhook"):
+            raise ValueError(f"Unknown EventSub transport: {transport}")
+        if transport == "webhook" and not (secret and callback_url):
+            raise ValueError(
+                "Webhook transport needs TWITCH_EVENTSUB_SECRET and "
+                "TWITCH_EVENTSUB_CALLBACK_URL"
+            )
+        self.on_event = on_event
+        self.streamers_file = streamers_file
+        self.transport = transport
+        self.ws_url = ws_url
+        self.subscriptions_url = subscriptions_url
+        self.secret = secret
+        self.callback_url = callback_url
+        self.port = port
+        self._recent_ids = RecentIds()
+        self._task: asyncio.Task | None = None
+        self._runner: web.AppRunner | None = None
+        self._pending: set[asyncio.Task] = set()
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.is_running():
+            return
+        if self.transport == "websocket":
+            self._task = asyncio.create_task(self._run_websocket())
+        else:
+            self._task = asyncio.create_task(self._run_webhook())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _dispatch(self, message_id: str, subscription_type: str, event: dict):
+        if self._recent_ids.seen(message_id):
+            logger.info(f"Skipping duplicate EventSub message {message_id}")
+            return
+        if subscription_type not in SUBSCRIPTION_TYPES:
+            return
+        try:
+            await self.on_event(subscription_type, event)
+        except Exception as e:
+            logger.error(f"Failed to handle EventSub {subscription_type}: {e}")
+
+    ##########################
+    ###### Subscriptions
+    ##########################
+    async def _get_broadcaster_ids(self) -> list[str]:
+        streamers = read_streamers(self.streamers_file)
+        users = await get_helix_all(
+            'https://api.twitch.tv/helix/users', "login", streamers
+        )
+        return [user['id'] for user in users.values()]
+
+    async def _get_app_access_token(self) -> str:
+        """
+        Webhook subscriptions must be created with an app access token
+        """
+        session = await open_twitch_session()
+        payload = {
+            "grant_type": "client_credentials",
+            "client_id": TWITCH_CLIENT_ID,
+            "client_secret": TWITCH_CLIENT_SECRET
+        }
+        async with session.post('https://id.twitch.tv/oauth2/token', data=payload) as r:
+            r.raise_for_status()
+            data = await r.json()
+        return data['access_token']
+
+    async def _subscribe_all(self, transport: dict, headers: dict):
+        session = await open_twitch_session()
+        created = 0
+        for broadcaster_id in await self._get_broadcaster_ids():
+            for subscription_type in SUBSCRIPTION_TYPES:
+                body = {
+                    "type": subscription_type,
+                    "version": "1",
+                    "condition": {"broadcaster_user_id": broadcaster_id},
+                    "transport": transport
+                }
+                async with session.post(
+                    self.subscriptions_url, json=body, headers=headers
+                ) as r:
+                    # 409 - already subscribed, e.g. after a webhook restart
+                    if r.status in (202, 409):
+                        created += r.status == 202
+                    else:
+                        logger.error(
+                            f"Failed to subscribe to {subscription_type} for "
+                            f"{broadcaster_id}: {r.status} {await r.text()}"
+                        )
+        logger.info(f"Created {created} EventSub subscriptions")
+
+    ##########################
+    ###### Websocket transport
+    ##########################
+    async def _run_websocket(self):
+        url = self.ws_url
+        delay = 1
+        session = await open_twitch_session()
+        while True:
+            try:
+                url = await self._read_websocket(session, url)
+                delay = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"EventSub websocket failed, reconnecting in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+                url = self.ws_url   # a fresh session needs new subscriptions
+
+    async def _read_websocket(self, session: aiohttp.ClientSession, url: str) -> str:
+        """
+        Read one websocket session until it ends
+
+        Returns the URL to connect to next: the reconnect URL Twitch sent, or
+        the configured URL when the session has to be started over.
+        """
+        is_reconnect = url != self.ws_url
+        keepalive = 30
+        async with session.ws_connect(url) as ws:
+            while True:
+                # Twitch promises a message at least every keepalive seconds
+                msg = await asyncio.wait_for(ws.receive(), timeout=keepalive + 10)
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    logger.warning(f"EventSub websocket closed: {msg.type}")
+                    return self.ws_url
+
+                data = json.loads(msg.data)
+                metadata = data['metadata']
+                payload = data['payload']
+                message_type = metadata['message_type']
+                if message_type == "session_welcome":
+                    keepalive = payload['session'].get('keepalive_timeout_seconds') or keepalive
+                    if not is_reconnect:
+                        # Subscriptions carry over to the reconnect URL
+                        await self._subscribe_all(
+                            {"method": "websocket", "session_id": payload['session']['id']},
+                            get_helix_headers()
+                        )
+                elif message_type == "notification":
+                    await self._dispatch(
+                        metadata['message_id'],
+                        metadata['subscription_type'],
+                        payload['event']
+                    )
+                elif message_type == "session_reconnect":
+                    logger.info("EventSub asked to reconnect")
+                    return payload['session']['reconnect_url']
+                elif message_type == "revocation":
+                    logger.warning(
+                        f"EventSub subscription revoked: {payload['subscription']}"
+                    )
+
+    ##########################
+    ###### Webhook transport
+    ##########################
+    async def _run_webhook(self):
+        """
+        Serve the webhook until cancelled, subscribing once it is listening
+        """
+        app = web.Application()
+        app.router.add_post("/eventsub", self.handle_webhook)
+        self._runner = web.AppRunner(app)
+        try:
+            await self._runner.setup()
+            try:
+                await web.TCPSite(self._runner, port=self.port).start()
+            except OSError as e:
+                logger.error(f"EventSub webhook failed to listen on port {self.port}: {e}")
+                return
+            logger.info(f"EventSub webhook listening on port {self.port}")
+
+            delay = 1
+            while True:
+                try:
+                    app_token = await self._get_app_access_token()
+                    await self._subscribe_all(
+                        {
+                            "method": "webhook",
+                            "callback": self.callback_url,
+                            "secret": self.secret
+                        },
+                        {
+                            "Authorization": f"Bearer {app_token}",
+                            "Client-Id": TWITCH_CLIENT_ID
+                        }
+                    )
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"EventSub webhook subscriptions failed, retrying in {delay}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 60)
+
+            # Notifications arrive through handle_webhook
+            await asyncio.Event().wait()
+        finally:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_webhook(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        message_id = request.headers.get(HEADER_ID, "")
+        timestamp = request.headers.get(HEADER_TIMESTAMP, "")
+        if not verify_signature(
+            self.secret,
+            message_id,
+            timestamp,
+            body,
+            request.headers.get(HEADER_SIGNATURE)
+        ):
+            logger.warning("Rejected EventSub webhook with a bad signature")
+            return web.Response(status=403)
+        try:
+            sent_at = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        except ValueError:
+            return web.Response(status=400)
+        if datetime.now(timezone.utc) - sent_at > MAX_MESSAGE_AGE:
+            logger.warning(f"Rejected stale EventSub message {message_id}")
+            return web.Response(status=403)
+
+        data = json.loads(body)
+        message_type = request.headers.get(HEADER_TYPE)
+        if message_type == "webhook_callback_verification":
+            return web.Response(text=data['challenge'], content_type="text/plain")
+        if message_type == "notification":
+            # Answer right away, Twitch retries slow responses
+            task = asyncio.create_task(self._dispatch(
+                message_id,
+                data['subscription']['type'],
+                data['event']
+            ))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        elif message_type == "revocation":
+            logger.warning(f"EventSub subscription revoked: {data['subscription']}")
+        return web.Response(status=204)
+
+
+if __name__ == '__main__':
+    # Print events from the configured (or fake) EventSub server
+    async def print_event(event_type: str, event: dict):
+        print(event_type, event)
+
+    async def run():
+        manager = EventSubManager(
+            print_event,
+            "input/twitch_streamers.txt",
+            transport=twitch_config.TWITCH_EVENTSUB_TRANSPORT or "websocket"
+        )
+        manager.start()
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
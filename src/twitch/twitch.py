@@ -1,4 +1,4 @@
-import requests
+import aiohttp
 from config.logger_config import get_logger
 import asyncio
 from urllib.parse import quote
@@ -7,8 +7,8 @@ from db.db_init import (
 )
 from db.streamer import (
     add_or_update_streamer_db,
-    get_is_live_status_db,
-    get_twitch_profile_pic
+    streamer_cache,
+    upsert_streamers_db
 )
 from utils.utils import (
     create_embedding,
@@ -31,6 +31,39 @@ TWITCH_ACCESS_TOKEN = twitch_config.TWITCH_ACCESS_TOKEN  # updated later
 # url encode the refresh token
 encoded_refresh_token = quote(TWITCH_REFRESH_TOKEN)
 
+# Helix accepts up to 100 user_login/login values per request
+HELIX_BATCH_SIZE = 100
+
+# Shared by every Twitch request, opened at bot startup and closed on shutdown
+twitch_session: aiohttp.ClientSession | None = None
+
+
+async def open_twitch_session():
+    """
+    Create the long-lived, connection-pooled client used for all Twitch calls.
+
+    Timeouts make sure a slow Twitch response fails the request instead of
+    holding up the polling loop.
+    """
+    global twitch_session
+    if twitch_session is None or twitch_session.closed:
+        twitch_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit_per_host=10,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            ),
+            timeout=aiohttp.ClientTimeout(total=10, connect=5)
+        )
+    return twitch_session
+
+
+async def close_twitch_session():
+    global twitch_session
+    if twitch_session is not None:
+        await twitch_session.close()
+        twitch_session = None
+
 
 async def update_user_access_token():
     """
@@ -46,46 +79,97 @@ async def update_user_access_token():
             "client_id": TWITCH_CLIENT_ID,
             "client_secret": TWITCH_CLIENT_SECRET
         }
-        r = requests.post(url, data=payload)
-        data = r.json()
+        session = await open_twitch_session()
+        async with session.post(url, data=payload) as r:
+            r.raise_for_status()
+            data = await r.json()
         TWITCH_ACCESS_TOKEN = data['access_token']
     except Exception as e:
         logger.error(f"Failed to refresh user access token - {e}")
 
-async def update_twitch_profile_pic(streamer: str):
+def get_helix_headers() -> dict:
+    """
+    Headers for Helix calls, read at call time since the token is refreshed hourly
     """
-    Update one twitch user's profile picture and username in database.
+    return {
+        "Authorization": f"Bearer {TWITCH_ACCESS_TOKEN}",
+        "Client-Id": TWITCH_CLIENT_ID
+    }
 
-    For twitch streams, profile pictures and usernames are added to database before
-    their online status is checked.
+
+async def get_helix_batch(url: str, param: str, logins: list[str]) -> list[dict]:
     """
-    try:
-        logger.info("Updating a Twitch profile picture")
-        url = 'https://api.twitch.tv/helix/users'
-        headers = {
-            "Authorization": f"Bearer {TWITCH_ACCESS_TOKEN}",
-            "Client-Id": TWITCH_CLIENT_ID
-        }
-        params = {
-            "login": streamer
-        }
-        r = requests.get(url, params=params, headers=headers)
-        data = r.json()['data']
+    Make one Helix request for up to HELIX_BATCH_SIZE logins.
 
-        parsed_data = {
-            "name": (data[0].get('display_name') if data else "N/A"),
-            "profile_pic": (
-                data[0].get('profile_image_url', "N/A")
-                if data else "N/A"
-            ),
-            "url": f"https://twitch.tv/{streamer}"
-        }
+    Parameters
+    ---------
+    url: str
+        Helix endpoint, e.g. https://api.twitch.tv/helix/streams
 
-        # Twitch name exists
-        if parsed_data['name'] != "N/A":
-            await add_or_update_streamer_db(async_session, parsed_data)
-    except Exception as e:
-        logger.error(f"Failed to get one twitch profile picture - {e}")
+    param: str
+        Query parameter repeated once per login, e.g. "user_login"
+
+    logins: list[str]
+        Twitch logins (case-insensitive)
+    """
+    headers = get_helix_headers()
+    params = [(param, login) for login in logins]
+    if url.endswith("/streams"):
+        # helix/streams pages at 20 results unless asked for more
+        params.append(("first", str(HELIX_BATCH_SIZE)))
+    session = await open_twitch_session()
+    async with session.get(url, params=params, headers=headers) as r:
+        r.raise_for_status()
+        data = await r.json()
+    return data['data']
+
+
+async def get_helix_all(url: str, param: str, logins: list[str]) -> dict[str, dict]:
+    """
+    Split logins into chunks of HELIX_BATCH_SIZE and request them concurrently.
+
+    Returns
+    ---------
+    dict[str, dict]
+        Helix entries keyed by lowercase login. Logins missing from Helix's
+        answer (offline streams, unknown users) are absent.
+    """
+    chunks = [
+        logins[i:i + HELIX_BATCH_SIZE]
+        for i in range(0, len(logins), HELIX_BATCH_SIZE)
+    ]
+    results = await asyncio.gather(*[
+        get_helix_batch(url, param, chunk) for chunk in chunks
+    ])
+    entries = {}
+    for data in results:
+        for entry in data:
+            # streams use user_login, users use login
+            login = entry.get('user_login') or entry.get('login')
+            entries[login.lower()] = entry
+    return entries
+
+
+def parse_twitch_user(streamer: str, user: dict | None) -> dict | None:
+    """
+    Build one twitch user's profile picture and username row for the database.
+
+    Parameters
+    ---------
+    streamer: str
+        The name of the Twitch streamer (case-insensitive)
+
+    user: dict | None
+        The streamer's entry from helix/users, None if Twitch did not return one
+    """
+    # Twitch name does not exist
+    if not user:
+        return None
+    return {
+        "name": user.get('display_name'),
+        "profile_pic": user.get('profile_image_url', "N/A"),
+        "url": f"https://twitch.tv/{streamer}"
+    }
 
 async def update_all_twitch_profile_pics(streamers: list[str]):
     """
@@ -93,39 +177,49 @@ async def update_all_twitch_profile_pics(streamers: list[str]):
     their online status is checked.
     """
     logger.info("Updating all Twitch profile pictures")
-    tasks = []
-    for streamer in streamers:
-        tasks.append(asyncio.create_task(
-            update_twitch_profile_pic(
-                streamer=streamer,
-            )
+    try:
+        users = await get_helix_all(
+            'https://api.twitch.tv/helix/users', "login", streamers
         )
-    )
-    await asyncio.gather(*tasks)
+    except Exception as e:
+        logger.error(f"Failed to get twitch profile pictures - {e}")
+        return
 
-async def get_twitch_stream_status(client: Bot, streamer: str):
-    try:
-        logger.info("Getting a Twitch stream status")
-        url = 'https://api.twitch.tv/helix/streams'
-        headers = {
-            "Authorization": f"Bearer {TWITCH_ACCESS_TOKEN}",
-            "Client-Id": TWITCH_CLIENT_ID
-        }
-        params = {
-            "user_login": streamer
-        }
-        r = requests.get(url, params=params, headers=headers)
-        data = r.json()['data']
+    rows = [parse_twitch_user(streamer, users.get(streamer.lower())) for streamer in streamers]
+    await upsert_streamers_db(async_session, [data for data in rows if data])
+
+async def get_twitch_stream_status(
+    client: Bot,
+    streamer: str,
+    stream: dict | None
+) -> dict | None:
+    """
+    Handle one streamer's entry from a batched helix/streams request
 
+    Returns the streamer's row to upsert when they went live or offline,
+    otherwise None.
+
+    Parameters
+    ---------
+    client: discord.ext.commands.Bot
+        Discord bot instance, used to send embedding to discord channel.
+
+    streamer: str
+        The name of the Twitch streamer (case-insensitive)
+
+    stream: dict | None
+        The streamer's entry from helix/streams, None if they are offline
+    """
+    try:
         video_thumbnail = (
-            data[0].get("thumbnail_url", "N/A")
-            if data else "N/A"
+            stream.get("thumbnail_url", "N/A")
+            if stream else "N/A"
         )
         parsed_data = {
             "name": streamer,
-            "title": (data[0].get('title', "N/A") if data else "N/A"),
-            "is_live": (True if data else False),
-            "stream_id": (data[0].get('stream_id', -1) if data else -1),
+            "title": (stream.get('title', "N/A") if stream else "N/A"),
+            "is_live": (True if stream else False),
+            "stream_id": (stream.get('stream_id', -1) if stream else -1),
             "video_thumbnail": (
                 video_thumbnail.format(width=1920, height=1080)
                 if video_thumbnail != "N/A" else "N/A"
@@ -133,16 +227,10 @@ async def get_twitch_stream_status(client: Bot, streamer: str):
             "url": f"https://twitch.tv/{streamer}"
         }
 
-        # Profile picture not in data - obtain from db
-        parsed_data["profile_pic"] = await get_twitch_profile_pic(
-            async_session,
-            parsed_data
-        )
+        # Profile picture not in data - obtain from cache
+        parsed_data["profile_pic"] = streamer_cache.profile_pic(streamer)
 
-        was_is_live = await get_is_live_status_db(
-            async_session,
-            parsed_data
-        )
+        was_is_live = streamer_cache.is_live(streamer)
         current_is_live = parsed_data['is_live']
 
         # send embedding to channel
@@ -150,29 +238,80 @@ async def get_twitch_stream_status(client: Bot, streamer: str):
             embed = create_embedding(parsed_data, "Twitch")
             parsed_data['start_time'] = datetime.now(timezone.utc)
             await send_live_notification(client, embed)
-            await add_or_update_streamer_db(async_session, parsed_data)
+            return parsed_data
         elif was_is_live and not current_is_live:
             parsed_data['start_time'] = datetime.now(timezone.utc)
-            await add_or_update_streamer_db(async_session, parsed_data)
+            return parsed_data
 
     except Exception as e:
         logger.error(f"Failed to get a twitch user status - {e}")
+    return None
 
 
 async def get_all_twitch_stream_status(client: Bot, streamers: list[str]):
     await update_all_twitch_profile_pics(streamers)  # do before
     logger.info("Getting all Twitch streams statuses")
 
+    try:
+        streams = await get_helix_all(
+            'https://api.twitch.tv/helix/streams', "user_login", streamers
+        )
+    except Exception as e:
+        logger.error(f"Failed to get twitch stream statuses - {e}")
+        return
+
     tasks = []
     for streamer in streamers:
         tasks.append(asyncio.create_task(
             get_twitch_stream_status(
                 client=client,
-                streamer=streamer
+                streamer=streamer,
+                stream=streams.get(streamer.lower())
             )
         )
     )
-    await asyncio.gather(*tasks)
+    results = await asyncio.gather(*tasks)
+    await upsert_streamers_db(async_session, [data for data in results if data])
+
+
+async def handle_twitch_stream_event(client: Bot, event_type: str, event: dict):
+    """
+    Apply an EventSub stream.online or stream.offline event
+
+    The event only carries the broadcaster, so for stream.online the title and
+    thumbnail are looked up on helix/streams. Helix can lag behind EventSub by
+    a few seconds, in which case the streamer is still marked live and the
+    reconciliation poll fills in the details.
+
+    Parameters
+    ---------
+    client: discord.ext.commands.Bot
+        Discord bot instance, used to send embedding to discord channel.
+
+    event_type: str
+        "stream.online" or "stream.offline"
+
+    event: dict
+        The "event" object of the EventSub notification
+    """
+    streamer = event['broadcaster_user_login']
+    logger.info(f"EventSub {event_type} for {streamer}")
+    if event_type == "stream.online":
+        try:
+            streams = await get_helix_all(
+                'https://api.twitch.tv/helix/streams', "user_login", [streamer]
+            )
+        except Exception as e:
+            logger.error(f"Failed to get twitch stream for {streamer} - {e}")
+            streams = {}
+        stream = streams.get(streamer.lower(), {"title": "N/A"})
+    elif event_type == "stream.offline":
+        stream = None
+    else:
+        return
+    data = await get_twitch_stream_status(client, streamer, stream)
+    if data:
+        await add_or_update_streamer_db(async_session, data)
 
 
 if __name__ == '__main__':
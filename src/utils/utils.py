@@ -1,5 +1,7 @@
 import discord
+import hashlib
 import json
+from collections import deque
 from config.logger_config import get_logger
 from datetime import datetime, timedelta, timezone
 from config.config import DiscordConfig
@@ -9,6 +11,9 @@ logger = get_logger(__name__)
 discord_config = DiscordConfig(".env")
 DISCORD_LIVE_CHANNEL_ID = discord_config.LIVE_CHANNEL_ID
 
+DISCORD_MESSAGE_LIMIT = 2000
+BLANK_PAGE = "\u200b"  # Discord rejects empty messages
+
 
 async def send_live_notification(
     client: discord.Client,
@@ -64,6 +69,27 @@ def read_streamers(file_name: str):
     return streamers
 
 
+class RecentIds:
+    """
+    Remember the last `size` message ids, to skip messages delivered twice
+    """
+    def __init__(self, size: int = 1000):
+        self._order = deque(maxlen=size)
+        self._ids = set()
+
+    def seen(self, message_id: str | int) -> bool:
+        """
+        Return True if message_id was already seen, otherwise remember it
+        """
+        if message_id in self._ids:
+            return True
+        if len(self._order) == self._order.maxlen:
+            self._ids.discard(self._order[0])
+        self._order.append(message_id)
+        self._ids.add(message_id)
+        return False
+
+
 def dt_to_discord_time_stamp(time: datetime) -> str:
     time_float = time.timestamp()
     time_int = int(time_float)
@@ -71,33 +97,123 @@ def dt_to_discord_time_stamp(time: datetime) -> str:
     return discord_time_stamp_r
 
 
-def format_live_and_not_live_lists(
+def format_live_and_not_live_lines(
     live: list[dict],
     not_live: list[dict]
-) -> str:
-    formatted_string = "🔴 LIVE NOW 🔴 \n"
-    formatted_string += "".join([f"- [{data["name"]}]({data["url"]})" +
-        (
-            f" went live {dt_to_discord_time_stamp(data["start_time"])}\n"
-        ) for data in live
-    ])
+) -> list[str]:
+    """
+    The streamer lists as lines, each ending with a newline
+    """
+    lines = ["🔴 LIVE NOW 🔴 \n"]
+    lines += [
+        f"- [{data['name']}]({data['url']})" +
+        f" went live {dt_to_discord_time_stamp(data['start_time'])}\n"
+        for data in live
+    ]
 
-    formatted_string += "\n"
+    lines.append("\n")
 
-    formatted_string += "⛔ OFFLINE ⛔ \n"
+    lines.append("⛔ OFFLINE ⛔ \n")
 
     curr_time = datetime.now(timezone.utc)
 
-    formatted_string += "".join([
-        f"{index + 1}. [{data["name"]}]({data["url"]}) " +
+    lines += [
+        f"{index + 1}. [{data['name']}]({data['url']}) " +
         (
-            f"(last seen {dt_to_discord_time_stamp(data["start_time"])}\n"
-            if curr_time - data["start_time"] < timedelta(days=700)
+            f"(last seen {dt_to_discord_time_stamp(data['start_time'])}\n"
+            if curr_time - data['start_time'] < timedelta(days=700)
             else "\n"
         )
         for index, data in enumerate(not_live)
-    ])  # timedelta to avoid printing times without valid start_times
+    ]  # timedelta to avoid printing times without valid start_times
+
+    return lines
 
-    formatted_string += dt_to_discord_time_stamp(datetime.now())
+
+def format_live_and_not_live_lists(
+    live: list[dict],
+    not_live: list[dict],
+    include_timestamp: bool = True
+) -> str:
+    formatted_string = "".join(format_live_and_not_live_lines(live, not_live))
+
+    # Changes on every call, leave out to compare renders
+    if include_timestamp:
+        formatted_string += dt_to_discord_time_stamp(datetime.now())
 
     return formatted_string
+
+
+def paginate_live_and_not_live_lists(
+    live: list[dict],
+    not_live: list[dict],
+    limit: int = DISCORD_MESSAGE_LIMIT - 32
+) -> list[str]:
+    """
+    Split the streamer lists into pages of at most limit characters
+
+    Pages break between lines. The default limit leaves room for the
+    timestamp added to the last page.
+    """
+    pages = [""]
+    for line in format_live_and_not_live_lines(live, not_live):
+        if pages[-1] and len(pages[-1]) + len(line) > limit:
+            pages.append("")
+        pages[-1] += line
+    return pages
+
+
+class StreamerBoard:
+    """
+    The streamer lists spread over as many messages as they need.
+
+    The first page is the message STREAMERS_MESSAGE_ID. Further pages are the
+    bot's own messages posted after it in the same channel, new ones are sent
+    when the lists grow and unused ones are blanked. Every page's content is
+    hashed, and only pages whose content changed are edited.
+    """
+    def __init__(self, channel_id: int, first_message_id: int):
+        self.channel_id = channel_id
+        self.first_message_id = first_message_id
+        self._messages: list[discord.Message] | None = None
+        self._hashes: list[str | None] = []
+
+    async def _load_messages(self, client: discord.Client):
+        channel = client.get_channel(self.channel_id)
+        first = await channel.fetch_message(self.first_message_id)
+        messages = [first]
+        async for message in channel.history(after=first, oldest_first=True):
+            if message.author == client.user:
+                messages.append(message)
+        self._messages = messages
+        self._hashes = [None] * len(messages)
+
+    async def render(
+        self,
+        client: discord.Client,
+        live: list[dict],
+        not_live: list[dict]
+    ):
+        if self._messages is None:
+            await self._load_messages(client)
+
+        pages = paginate_live_and_not_live_lists(live, not_live)
+        channel = self._messages[0].channel
+        while len(self._messages) < len(pages):
+            self._messages.append(await channel.send(BLANK_PAGE, suppress_embeds=True))
+            self._hashes.append(None)
+
+        try:
+            for index, message in enumerate(self._messages):
+                content = pages[index] if index < len(pages) else BLANK_PAGE
+                content_hash = hashlib.sha1(content.encode()).hexdigest()
+                if content_hash == self._hashes[index]:
+                    continue
+                if index == len(pages) - 1:
+                    content += dt_to_discord_time_stamp(datetime.now())
+                logger.info(f"Editing streamer list page {index + 1}")
+                await message.edit(content=content, suppress=True)
+                self._hashes[index] = content_hash
+        except discord.NotFound:
+            self._messages = None   # a page was deleted, reload next time
+            raise
@@ -0,0 +1,249 @@
+"""
+Check the game-chat parser against the golden corpus and time it.
+
+    PYTHONPATH=src python -m webhooks.benchmark
+    PYTHONPATH=src python -m webhooks.benchmark --save-baseline baseline.json
+    PYTHONPATH=src python -m webhooks.benchmark --compare baseline.json
+
+input/game_chat_golden.json holds synthetic messages for every category the
+classifier returns, with the fields every extract* function should give
+for them, and the bingo board, item names and prices they were recorded
+with, so results do not depend on input/bingo.json or the live prices.
+Entries with a "note" are edge cases, some of them documenting quirks of
+the current parser rather than what a player would expect.
+
+Every function is checked first, and the run exits with status 1 on a
+mismatch. Then each one is timed on the messages it is used for, as is
+the whole message, the way the bot used to handle it (getMessageCategory,
+extract* and checkForBingoDrop) and with parseGameChatMessage.
+Throughput is timed over whole rounds, latency per call with
+perf_counter_ns, which adds a few dozen nanoseconds to every call.
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Callable
+from prices.items import item_catalog
+from prices.prices import price_service
+from webhooks.webhooks import (
+    MessageCategory,
+    bingo_board,
+    checkForBingoDrop,
+    extractBoss,
+    extractDrop,
+    extractLootValue,
+    extractRSN,
+    extractTimeInSeconds,
+    getMessageCategory,
+    parseGameChatMessage
+)
+
+GOLDEN_FILE = "input/game_chat_golden.json"
+
+# Fields of a golden entry, besides message and category
+FIELDS = ("rsn", "item", "boss", "loot_value", "duration", "is_bingo", "bingo_team")
+
+
+def load_golden(path: str = GOLDEN_FILE) -> list[dict]:
+    """
+    Load the corpus and install its bingo board, item names and prices
+    """
+    with open(path, 'r') as f:
+        golden = json.load(f)
+    bingo_board.load_data(golden["bingo"])
+    bingo_board.reload_interval = float("inf")     # never replaced by input/bingo.json
+    item_catalog._set_mapping(golden["items"], time.time())
+    price_service._set_snapshot(
+        {item_id: {"low": price} for item_id, price in golden["prices"].items()},
+        time.time()
+    )
+    return golden["messages"]
+
+
+##########################
+###### Correctness
+##########################
+def parse_separately(message: str) -> dict | None:
+    """
+    The fields of a message from getMessageCategory and the extract* functions
+    """
+    content_dict = getMessageCategory(message)
+    if content_dict is None:
+        return None
+    category = content_dict["category"]
+    content_dict = checkForBingoDrop(message, content_dict)
+    duration = extractTimeInSeconds(message) if category == MessageCategory.PERSONAL_BEST else None
+    return {
+        "category": category.name,
+        "rsn": extractRSN(message, category),
+        "item": extractDrop(message, category),
+        "boss": extractBoss(message, category),
+        "loot_value": int(extractLootValue(message, category)),
+        "duration": duration if duration != "" else None,
+        "is_bingo": content_dict["is_bingo"],
+        "bingo_team": content_dict.get("bingo_team")
+    }
+
+
+def parse_together(message: str) -> dict | None:
+    """
+    The fields of a message from parseGameChatMessage, priced like the bot does
+    """
+    record = parseGameChatMessage(message)
+    if record is None:
+        return None
+    loot_value = record.loot_value
+    if loot_value is None:
+        loot_value = int(extractLootValue(message, record.category))
+    return {
+        "category": record.category.name,
+        "rsn": record.rsn,
+        "item": record.item,
+        "boss": record.boss,
+        "loot_value": loot_value,
+        "duration": record.duration,
+        "is_bingo": record.is_bingo,
+        "bingo_team": record.bingo_team
+    }
+
+
+def check(messages: list[dict]) -> list[str]:
+    """
+    Every difference between the corpus and what both parsers give
+    """
+    failures = []
+    for entry in messages:
+        message = entry["message"]
+        for name, parse in (("extract*", parse_separately), ("parseGameChatMessage", parse_together)):
+            try:
+                fields = parse(message)
+            except Exception as e:
+                failures.append(f"{name} raised {e!r}: {message!r}")
+                continue
+            if fields is None or entry["category"] is None:
+                if (fields and fields["category"]) != entry["category"]:
+                    failures.append(f"{name} category: expected {entry['category']}, "
+                                    f"got {fields and fields['category']}: {message!r}")
+                continue
+            for field in ("category",) + FIELDS:
+                if fields[field] != entry[field]:
+                    failures.append(f"{name} {field}: expected {entry[field]!r}, "
+                                    f"got {fields[field]!r}: {message!r}")
+    return failures
+
+
+##########################
+###### Timing
+##########################
+def time_calls(function: Callable, calls: list[tuple], min_seconds: float) -> dict:
+    """
+    Messages per second and latency percentiles of function over calls
+    """
+    rounds = 0
+    start = time.perf_counter()
+    while True:
+        for args in calls:
+            function(*args)
+        rounds += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            break
+
+    latencies = []
+    clock = time.perf_counter_ns
+    for _ in range(max(rounds // 10, 1)):
+        for args in calls:
+            call_start = clock()
+            function(*args)
+            latencies.append(clock() - call_start)
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return round(latencies[int(p * (len(latencies) - 1))] / 1000, 2)
+
+    return {
+        "msg_per_s": round(rounds * len(calls) / elapsed),
+        "p50_us": percentile(0.50),
+        "p99_us": percentile(0.99)
+    }
+
+
+def benchmarks(messages: list[dict]) -> dict[str, tuple[Callable, list[tuple]]]:
+    """
+    Each function and the argument tuples it is timed with, the ones the
+    bot would call it with for the corpus
+    """
+    every = [entry["message"] for entry in messages]
+    tracked = []
+    for message in every:
+        content_dict = getMessageCategory(message)
+        if content_dict is not None:
+            tracked.append((message, content_dict["category"]))
+
+    def with_category(*categories: MessageCategory) -> list[tuple]:
+        return [(message, category) for message, category in tracked if category in categories]
+
+    return {
+        "getMessageCategory": (getMessageCategory, [(message,) for message in every]),
+        "checkForBingoDrop": (
+            checkForBingoDrop,
+            [(message, {"category": category}) for message, category in tracked]
+        ),
+        "extractRSN": (extractRSN, tracked),
+        "extractDrop": (extractDrop, with_category(MessageCategory.DROP)),
+        "extractLootValue": (extractLootValue, with_category(MessageCategory.PK, MessageCategory.DROP)),
+        "extractTimeInSeconds": (
+            extractTimeInSeconds,
+            [(message,) for message, _ in with_category(MessageCategory.PERSONAL_BEST)]
+        ),
+        "end to end: extract*": (parse_separately, [(message,) for message in every]),
+        "end to end: parseGameChatMessage": (parse_together, [(message,) for message in every]),
+    }
+
+
+def compare(results: dict, baseline: dict):
+    print(f"{'':34} {'msg/s':>12} {'vs base':>8} {'p99 us':>8} {'vs base':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:34} {result['msg_per_s']:>12,} {'':>8} {result['p99_us']:>8} {'':>8}")
+            continue
+        speed = result["msg_per_s"] / base["msg_per_s"] - 1
+        latency = result["p99_us"] / base["p99_us"] - 1 if base["p99_us"] else 0.0
+        print(f"{name:34} {result['msg_per_s']:>12,} {speed:>+8.1%} "
+              f"{result['p99_us']:>8} {latency:>+8.1%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check and time the game-chat parser")
+    parser.add_argument("--golden", default=GOLDEN_FILE)
+    parser.add_argument("--seconds", type=float, default=1.0, help="minimum time per function")
+    parser.add_argument("--save-baseline", help="write the results to this file")
+    parser.add_argument("--compare", help="compare with results saved by --save-baseline")
+    args = parser.parse_args()
+
+    messages = load_golden(args.golden)
+    failures = check(messages)
+    for failure in failures:
+        print(failure)
+    categories = {entry["category"] for entry in messages}
+    print(f"{len(messages)} corpus messages, {len(categories) - (None in categories)} categories, "
+          f"{len(failures)} mismatches")
+    if failures:
+        sys.exit(1)
+
+    results = {}
+    for name, (function, calls) in benchmarks(messages).items():
+        results[name] = time_calls(function, calls, args.seconds)
+        print(f"{name:34} {results[name]['msg_per_s']:>12,} msg/s  "
+              f"p50 {results[name]['p50_us']:>6} us  p99 {results[name]['p99_us']:>6} us")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            print(f"\nCompared with {args.compare}:")
+            compare(results, json.load(f))
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Saved baseline to {args.save_baseline}")
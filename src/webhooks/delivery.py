@@ -0,0 +1,449 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import Counter, deque
+import aiohttp
+from config.config import WebhookConfig
+from config.logger_config import get_logger
+from webhooks.webhooks import openWebhookSession
+
+logger = get_logger(__name__)
+
+webhook_config = WebhookConfig(".env")
+
+DISCORD_MESSAGE_LIMIT = 2000
+DISCORD_EMBED_LIMIT = 10    # embeds per post
+
+OVERFLOW_POLICIES = ("drop", "merge", "spill")
+
+# Retries for 5xx and connection errors, 429s are retried until they succeed
+MAX_RETRIES = 5
+MAX_BACKOFF = 30
+
+
+class RateLimitBucket:
+    """
+    What Discord last told us about one rate limit bucket
+
+    Several webhook URLs can share a bucket, Discord names it in the
+    X-RateLimit-Bucket header.
+    """
+    def __init__(self):
+        self.remaining = 1
+        self.reset_at = 0.0
+
+    async def wait(self):
+        if self.remaining <= 0:
+            delay = self.reset_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.remaining = 1
+
+    def update(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        try:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset_after is not None:
+                self.reset_at = time.monotonic() + float(reset_after)
+        except ValueError:
+            logger.warning(f"Ignoring malformed rate limit headers: {remaining!r}, {reset_after!r}")
+
+    def block(self, retry_after: float):
+        self.remaining = 0
+        self.reset_at = time.monotonic() + retry_after
+
+
+class PendingBatch:
+    """
+    Lines or embeds for one webhook waiting out the coalescing window
+    """
+    def __init__(self, timer: asyncio.TimerHandle):
+        self.timer = timer
+        self.lines: list[str] = []
+        self.length = 0
+        self.embeds: list[dict] = []
+
+
+class WebhookQueue:
+    """
+    Pending posts for one webhook URL, sent in order by a single worker
+
+    When `size` posts are pending, new posts are handled by the overflow
+    policy: "drop" discards them, "merge" appends the text to the newest
+    pending post while it stays under Discord's 2000 characters (and drops
+    it otherwise), "spill" appends them to a file that is read back once
+    the queue has drained.
+    """
+    def __init__(self, delivery: "WebhookDelivery", url: str):
+        self.delivery = delivery
+        self.url = url
+        self._pending: deque[dict] = deque()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._spilled = 0
+        self._in_flight = False    # _pending[0] is being posted
+        digest = hashlib.sha1(url.encode()).hexdigest()[:16]
+        self.spill_file = os.path.join(delivery.spill_dir, f"{digest}.jsonl")
+        if os.path.exists(self.spill_file):
+            # Left over from the last run, sent before anything new
+            with open(self.spill_file, 'r') as f:
+                self._spilled = sum(1 for _ in f)
+        self._task = asyncio.create_task(self._run())
+
+    def __len__(self) -> int:
+        return len(self._pending) + self._spilled
+
+    def put(self, payload: dict) -> bool:
+        """
+        Queue payload, returns False if the overflow policy dropped it
+        """
+        metrics = self.delivery.metrics
+        if len(self._pending) >= self.delivery.size or self._spilled:
+            policy = self.delivery.overflow_policy
+            if policy == "spill":
+                # Once anything is on disk, everything newer goes there too
+                self._spill(payload)
+                metrics["spilled"] += 1
+            elif policy == "merge" and self._merge(payload):
+                metrics["merged"] += 1
+            else:
+                metrics["dropped"] += 1
+                logger.warning(f"Webhook queue full, dropped a post ({len(self)} pending)")
+                return False
+        else:
+            self._pending.append(payload)
+        metrics["queued"] += 1
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    def _merge(self, payload: dict) -> bool:
+        if len(self._pending) <= self._in_flight:
+            return False
+        last = self._pending[-1]
+        if set(last) != {"content"} or set(payload) != {"content"}:
+            return False
+        content = last["content"] + "\n" + payload["content"]
+        if len(content) > DISCORD_MESSAGE_LIMIT:
+            return False
+        last["content"] = content
+        return True
+
+    def _spill(self, payload: dict):
+        os.makedirs(self.delivery.spill_dir, exist_ok=True)
+        with open(self.spill_file, 'a') as f:
+            f.write(json.dumps(payload) + "\n")
+        self._spilled += 1
+
+    def _load_spilled(self):
+        """
+        Move up to `size` spilled posts back into memory, oldest first
+        """
+        with open(self.spill_file, 'r') as f:
+            lines = f.read().splitlines()
+        size = self.delivery.size
+        for line in lines[:size]:
+            try:
+                self._pending.append(json.loads(line))
+            except ValueError:
+                self.delivery.metrics["dropped"] += 1
+                logger.error(f"Dropped an unreadable spilled post: {line[:100]!r}")
+        rest = lines[size:]
+        if rest:
+            with open(self.spill_file, 'w') as f:
+                f.write("\n".join(rest) + "\n")
+        else:
+            os.remove(self.spill_file)
+        self._spilled = len(rest)
+
+    def spill_pending(self):
+        """
+        Write the posts still in memory to the spill file
+
+        They are older than the ones already spilled, so they go first.
+        """
+        if not self._pending:
+            return
+        lines = [json.dumps(payload) for payload in self._pending]
+        if os.path.exists(self.spill_file):
+            with open(self.spill_file, 'r') as f:
+                lines.extend(f.read().splitlines())
+        os.makedirs(self.delivery.spill_dir, exist_ok=True)
+        tmp_file = self.spill_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_file, self.spill_file)
+        self._pending.clear()
+        self._spilled = len(lines)
+
+    async def join(self):
+        await self._idle.wait()
+
+    async def close(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        while True:
+            if not self._pending and self._spilled:
+                try:
+                    self._load_spilled()
+                except OSError as e:
+                    # Set the file aside rather than failing on it forever
+                    logger.error(f"Failed to read spilled webhook posts, moving {self.spill_file} aside: {e}")
+                    self.delivery.metrics["dropped"] += self._spilled
+                    self._spilled = 0
+                    try:
+                        os.replace(self.spill_file, self.spill_file + ".failed")
+                    except OSError:
+                        pass
+            if not self._pending:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self._in_flight = True
+            try:
+                await self.delivery.post(self.url, self._pending[0])
+            except Exception as e:
+                # Drop the post, the queue keeps draining
+                self.delivery.metrics["failed"] += 1
+                logger.error(f"Dropped a webhook post after an unexpected error: {e!r}")
+                await asyncio.sleep(1)
+            finally:
+                self._in_flight = False
+            self._pending.popleft()
+
+
+class WebhookDelivery:
+    """
+    Send webhook posts in the background, one queue per webhook URL.
+
+    `enqueue` returns at once. Each queue's worker waits for its rate limit
+    bucket before posting, using the X-RateLimit-Remaining and
+    X-RateLimit-Reset-After headers of the previous response, and honours
+    the retry_after of a 429. A global 429 pauses every queue.
+
+    Parameters
+    ---------
+    size: int
+        Pending posts per webhook URL before the overflow policy applies.
+
+    overflow_policy: str
+        "drop", "merge" or "spill", see WebhookQueue.
+
+    spill_dir: str
+        Directory for the "spill" policy's files, one per webhook URL.
+
+    coalesce_window: float
+        Seconds to hold text lines and embeds so that the ones for the same
+        webhook go out as one post, of up to 2000 characters or 10 embeds.
+        0 posts every line on its own.
+    """
+    def __init__(
+        self,
+        size: int = int(webhook_config.WEBHOOK_QUEUE_SIZE),
+        overflow_policy: str = webhook_config.WEBHOOK_OVERFLOW_POLICY,
+        spill_dir: str = webhook_config.WEBHOOK_SPILL_DIR,
+        coalesce_window: float = float(webhook_config.WEBHOOK_COALESCE_WINDOW)
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown webhook overflow policy: {overflow_policy}")
+        self.size = size
+        self.overflow_policy = overflow_policy
+        self.spill_dir = spill_dir
+        self.coalesce_window = coalesce_window
+        self.metrics = Counter()
+        self._batches: dict[tuple[str, str], PendingBatch] = {}
+        self._queues: dict[str, WebhookQueue] = {}
+        self._buckets: dict[str, RateLimitBucket] = {}
+        self._bucket_by_url: dict[str, str] = {}
+        self._global_reset_at = 0.0
+
+    def enqueue(self, webhook_url: str, message: str) -> bool:
+        """
+        Queue a text post, returns False if it was dropped
+
+        With a coalescing window the line is held back and joined with the
+        webhook's other lines, and always reported as queued.
+        """
+        if not webhook_url:
+            return False
+        if self.coalesce_window <= 0:
+            return self.enqueue_payload(webhook_url, {"content": message})
+        batch = self._batches.get((webhook_url, "content"))
+        if batch and batch.length + 1 + len(message) > DISCORD_MESSAGE_LIMIT:
+            self._flush_batch(webhook_url, "content")
+            batch = None
+        if batch is None:
+            batch = self._new_batch(webhook_url, "content")
+        else:
+            self.metrics["coalesced"] += 1
+        batch.length += len(message) + bool(batch.lines)
+        batch.lines.append(message)
+        return True
+
+    def enqueue_embed(self, webhook_url: str, embed: dict) -> bool:
+        """
+        Queue an embed, coalesced into posts of up to 10 like enqueue's lines
+        """
+        if not webhook_url:
+            return False
+        if self.coalesce_window <= 0:
+            return self.enqueue_payload(webhook_url, {"embeds": [embed]})
+        batch = self._batches.get((webhook_url, "embeds"))
+        if batch is None:
+            batch = self._new_batch(webhook_url, "embeds")
+        else:
+            self.metrics["coalesced"] += 1
+        batch.embeds.append(embed)
+        if len(batch.embeds) == DISCORD_EMBED_LIMIT:
+            self._flush_batch(webhook_url, "embeds")
+        return True
+
+    def _new_batch(self, webhook_url: str, kind: str) -> PendingBatch:
+        timer = asyncio.get_running_loop().call_later(
+            self.coalesce_window, self._flush_batch, webhook_url, kind
+        )
+        batch = self._batches[(webhook_url, kind)] = PendingBatch(timer)
+        return batch
+
+    def _flush_batch(self, webhook_url: str, kind: str):
+        batch = self._batches.pop((webhook_url, kind), None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        if kind == "content":
+            self.enqueue_payload(webhook_url, {"content": "\n".join(batch.lines)})
+        else:
+            self.enqueue_payload(webhook_url, {"embeds": batch.embeds})
+
+    def flush(self):
+        """
+        Queue every held back line and embed now
+        """
+        for webhook_url, kind in list(self._batches):
+            self._flush_batch(webhook_url, kind)
+
+    def enqueue_payload(self, webhook_url: str, payload: dict) -> bool:
+        """
+        Queue a raw webhook payload, e.g. {"embeds": [...]}
+        """
+        if not webhook_url:
+            return False
+        queue = self._queues.get(webhook_url)
+        if queue is None:
+            queue = self._queues[webhook_url] = WebhookQueue(self, webhook_url)
+        return queue.put(payload)
+
+    def queue_depths(self) -> dict[str, int]:
+        return {url: len(queue) for url, queue in self._queues.items()}
+
+    async def close(self, timeout: float = 10):
+        """
+        Give the queues up to `timeout` seconds to drain, then stop them
+
+        Posts still in memory are lost unless the policy is "spill", in
+        which case they are written to disk for the next start.
+        """
+        self.flush()
+        queues = list(self._queues.values())
+        if queues:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*[queue.join() for queue in queues]),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Webhook queues did not drain: {self.queue_depths()}")
+        for queue in queues:
+            await queue.close()
+            if self.overflow_policy == "spill":
+                queue.spill_pending()
+        self._queues.clear()
+        logger.info(f"Webhook delivery: {dict(self.metrics)}")
+
+    def _bucket(self, webhook_url: str) -> RateLimitBucket:
+        key = self._bucket_by_url.get(webhook_url, webhook_url)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = RateLimitBucket()
+        return bucket
+
+    async def post(self, webhook_url: str, payload: dict):
+        """
+        Post payload, retrying until it is sent or can not be sent
+
+        429s wait for retry_after and are retried without limit. 5xx and
+        connection errors back off exponentially, up to MAX_RETRIES times.
+        Other 4xx responses are logged and the post is dropped.
+        """
+        attempt = 0
+        while True:
+            delay = self._global_reset_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            bucket = self._bucket(webhook_url)
+            await bucket.wait()
+
+            session = await openWebhookSession()
+            try:
+                async with session.post(url=webhook_url, json=payload) as resp:
+                    bucket_name = resp.headers.get("X-RateLimit-Bucket")
+                    if bucket_name and self._bucket_by_url.get(webhook_url) != bucket_name:
+                        self._bucket_by_url[webhook_url] = bucket_name
+                        bucket = self._buckets.setdefault(bucket_name, bucket)
+                    bucket.update(resp.headers)
+
+                    if resp.status == 429:
+                        self.metrics["rate_limited"] += 1
+                        try:
+                            data = await resp.json(content_type=None)
+                        except ValueError:
+                            data = {}
+                        try:
+                            retry_after = float(
+                                data.get("retry_after")
+                                or resp.headers.get("Retry-After")
+                                or 1
+                            )
+                        except (TypeError, ValueError):
+                            retry_after = 1.0
+                        if data.get("global") or resp.headers.get("X-RateLimit-Global"):
+                            self._global_reset_at = time.monotonic() + retry_after
+                        else:
+                            bucket.block(retry_after)
+                        logger.warning(f"Webhook rate limited, retrying in {retry_after}s")
+                        continue
+                    if resp.status < 500:
+                        resp.raise_for_status()
+                        self.metrics["sent"] += 1
+                        return
+                    error = f"{resp.status} {resp.reason}"
+            except aiohttp.ClientResponseError as e:
+                self.metrics["failed"] += 1
+                logger.error(f"Failed to send content to webhook_url: {e}")
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+
+            attempt += 1
+            if attempt > MAX_RETRIES:
+                self.metrics["failed"] += 1
+                logger.error(f"Giving up on webhook post after {MAX_RETRIES} retries: {error}")
+                return
+            self.metrics["retried"] += 1
+            backoff = min(2 ** (attempt - 1), MAX_BACKOFF)
+            logger.warning(f"Webhook post failed ({error}), retrying in {backoff}s")
+            await asyncio.sleep(backoff)
+
+
+webhook_delivery = WebhookDelivery()
@@ -0,0 +1,185 @@
+import asyncio
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Awaitable, Callable
+from config.logger_config import get_logger
+from utils.utils import RecentIds
+from webhooks.webhooks import GameChatRecord, parseGameChatMessage
+
+logger = get_logger(__name__)
+
+RecordHandler = Callable[[str, GameChatRecord], Awaitable[None]]
+
+
+class StageTimings:
+    """
+    Count, total and max time of every stage a message goes through
+    """
+    def __init__(self):
+        self._count: Counter = Counter()
+        self._total: Counter = Counter()
+        self._max: dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self._count[stage] += 1
+        self._total[stage] += seconds
+        if seconds > self._max.get(stage, 0.0):
+            self._max[stage] = seconds
+
+    def summary(self) -> dict[str, dict]:
+        return {
+            stage: {
+                "count": count,
+                "avg_ms": round(self._total[stage] / count * 1000, 3),
+                "max_ms": round(self._max[stage] * 1000, 3)
+            }
+            for stage, count in self._count.items()
+        }
+
+
+class GameChatPipeline:
+    """
+    Handle game-chat messages off the Discord event loop's critical path.
+
+    `submit` puts the raw message on a bounded queue and returns. A
+    dispatcher parses it and hands the record to one of `workers` worker
+    queues, chosen by RSN, so one player's messages are handled in order
+    while different players' are handled side by side. Each worker awaits
+    `handle(no_emoji_message, record)`.
+
+    Messages are identified by their Discord message id. One already seen
+    recently is skipped before it is queued, and the id is kept on the
+    record so the database can skip it too.
+
+    Parameters
+    ---------
+    handle: Callable[[str, GameChatRecord], Awaitable[None]]
+        Called once per parsed record. Use `stage(name)` inside it to time
+        its steps.
+
+    workers: int
+        Worker tasks, and so players handled at the same time.
+
+    queue_size: int
+        Messages waiting to be parsed, and per worker. When the first queue
+        is full `submit` waits, which is counted as an overflow.
+    """
+    def __init__(
+        self,
+        handle: RecordHandler,
+        workers: int = 4,
+        queue_size: int = 1000
+    ):
+        self.handle = handle
+        self.metrics = Counter()
+        self.timings = StageTimings()
+        self._recent_ids = RecentIds(size=10_000)
+        self._incoming: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._worker_queues: list[asyncio.Queue] = [
+            asyncio.Queue(maxsize=queue_size) for _ in range(workers)
+        ]
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        for queue in self._worker_queues:
+            self._tasks.append(asyncio.create_task(self._work(queue)))
+
+    def queue_depths(self) -> dict[str, int]:
+        depths = {"incoming": self._incoming.qsize()}
+        for index, queue in enumerate(self._worker_queues):
+            depths[f"worker_{index}"] = queue.qsize()
+        return depths
+
+    def stats(self) -> dict:
+        return {
+            "queues": self.queue_depths(),
+            "counts": dict(self.metrics),
+            "stages": self.timings.summary()
+        }
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.add(name, time.perf_counter() - start)
+
+    async def submit(self, message_id: int, content: str):
+        """
+        Queue a game-chat message, skipping one that was already submitted
+        """
+        if self._recent_ids.seen(message_id):
+            self.metrics["duplicates"] += 1
+            return
+        item = (message_id, content, time.perf_counter())
+        try:
+            self._incoming.put_nowait(item)
+        except asyncio.QueueFull:
+            self.metrics["overflows"] += 1
+            if self.metrics["overflows"] % 100 == 1:
+                logger.warning(
+                    f"Game-chat queue full, waiting ({self.metrics['overflows']} "
+                    f"overflows so far): {self.queue_depths()}"
+                )
+            await self._incoming.put(item)
+        self.metrics["submitted"] += 1
+
+    async def _dispatch(self):
+        while True:
+            message_id, content, submitted_at = await self._incoming.get()
+            try:
+                self.timings.add("queued", time.perf_counter() - submitted_at)
+                with self.stage("parse"):
+                    # <:TaskMastericon:1147705076677345322>ScytheMane has completed the Hard Kandarin diary.
+                    #   Remove the prefix, <:TaskMastericon:1147705076677345322>
+                    no_emoji_message = content[content.find(">") + 1:]
+                    record = parseGameChatMessage(no_emoji_message)
+                if record is None:
+                    self.metrics["unparsed"] += 1
+                    continue
+                record.message_id = message_id
+                key = record.rsn.lower() if record.rsn else message_id
+                queue = self._worker_queues[hash(key) % len(self._worker_queues)]
+                await queue.put((no_emoji_message, record))
+            except Exception as e:
+                logger.error(f"Failed to parse game-chat message {message_id}: {e}")
+            finally:
+                self._incoming.task_done()
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            no_emoji_message, record = await queue.get()
+            try:
+                with self.stage("handle"):
+                    await self.handle(no_emoji_message, record)
+                self.metrics["handled"] += 1
+            except Exception as e:
+                self.metrics["failed"] += 1
+                logger.error(f"Failed to handle game-chat message {record.message_id}: {e}")
+            finally:
+                queue.task_done()
+
+    async def close(self, timeout: float = 10):
+        """
+        Give queued messages up to `timeout` seconds to be handled, then stop
+        """
+        async def drain():
+            await self._incoming.join()
+            for queue in self._worker_queues:
+                await queue.join()
+
+        if self._tasks:
+            try:
+                await asyncio.wait_for(drain(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Game-chat queues did not drain: {self.queue_depths()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"Game-chat pipeline: {self.stats()}")
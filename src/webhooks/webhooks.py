@@ -1,14 +1,23 @@
+from dataclasses import dataclass
 from enum import Enum
 import aiohttp
 from config.config import WebhookConfig
+import json
+import os
 import re
+import time
 from config.logger_config import get_logger
+from prices.items import item_catalog
+from prices.prices import price_service
 
 logger = get_logger(__name__)
 
 ### Get discord webhooks
 webhook_config = WebhookConfig(".env")
 
+# Bingo items and teams, reloaded when the file changes
+BINGO_FILE = "input/bingo.json"
+
 
 class MessageCategory(Enum):
     PK = 0
@@ -31,24 +40,157 @@ class MessageCategory(Enum):
     IDK = 17    # FIXME: if this is assigned, code does not handle all cases
 
 
+# Shared by every webhook post, opened at bot startup and closed on shutdown
+webhook_session: aiohttp.ClientSession | None = None
+
+
+async def openWebhookSession() -> aiohttp.ClientSession:
+    """
+    Create the long-lived, connection-pooled client used for webhook posts.
+
+    Every post reuses a kept-alive connection to discord.com instead of
+    paying for a new TCP and TLS handshake.
+    """
+    global webhook_session
+    if webhook_session is None or webhook_session.closed:
+        webhook_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit_per_host=10,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            ),
+            timeout=aiohttp.ClientTimeout(total=10, connect=5),
+            headers={"Content-Type": "application/json"}
+        )
+    return webhook_session
+
+
+async def closeWebhookSession() -> None:
+    global webhook_session
+    if webhook_session is not None:
+        await webhook_session.close()
+        webhook_session = None
+
+
 async def sendContentToWebhook(webhook_url: str, message: str) -> None:
     # Format json for POST
     payload = {
         "content": f"{message}"
     }
-    
-    headers = {
-        "Content-Type": "application/json"
-    }
 
     # POST to webhook URL
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url=webhook_url, headers=headers, json=payload) as resp:
-            try:
-                resp.raise_for_status()
-                logger.info(f"Sent content to webhook_url")
-            except Exception as e:
-                logger.error(f"Failed to send content to webhook_url: {e}")
+    session = await openWebhookSession()
+    try:
+        async with session.post(url=webhook_url, json=payload) as resp:
+            resp.raise_for_status()
+            logger.info(f"Sent content to webhook_url")
+    except Exception as e:
+        logger.error(f"Failed to send content to webhook_url: {e}")
+
+
+# Prefix emoji and webhook url of every category that is sent to a webhook
+CATEGORY_OUTPUT = {
+    MessageCategory.PK: (":skull_crossbones:", webhook_config.PK_URL),
+    MessageCategory.DEATH: (":headstone:", webhook_config.DEATH_URL),
+    MessageCategory.DROP: (":moneybag:", webhook_config.DROP_URL),
+    MessageCategory.LEVEL: (":partying_face:", webhook_config.LEVEL_URL),
+    MessageCategory.QUEST: (":tada:", webhook_config.QUEST_URL),
+    MessageCategory.PET: (":dragon:", webhook_config.PET_URL),
+    MessageCategory.PERSONAL_BEST: (":medal:", webhook_config.PERSONAL_BEST_URL),
+    MessageCategory.COLLECTION_LOG: (":closed_book:", webhook_config.COLLECTION_LOG_URL),
+    MessageCategory.INVITED: (":slight_smile:", webhook_config.INVITED_URL),
+    MessageCategory.LEFT: (":cry:", webhook_config.LEFT_URL),
+    MessageCategory.DIARY: (":green_book:", webhook_config.DIARY_URL),
+    MessageCategory.CB_ACHIEVEMENT: (":blue_book:", webhook_config.CB_ACHIEVEMENT_URL),
+    MessageCategory.CB_TASK: (":crossed_swords:", webhook_config.CB_TASK_URL),
+}
+
+# (category, prefix emoji, webhook url) - a classifier result
+CATEGORY_RESULT = {
+    category: (category, prefix, url)
+    for category, (prefix, url) in CATEGORY_OUTPUT.items()
+}
+
+# Categories of in-game messages, built once at import.
+#   Every phrase of a category with a colon ends in that colon, so when a
+#   message has exactly one colon, the phrase can only end at it. Those
+#   phrases are looked up by the 4 characters before the colon.
+#   Player chat is "RSN: message" and RSNs are at most 12 characters, so
+#   personal bests and combat tasks need their first colon further in.
+COLON_PHRASES = {}
+for phrase, category, after_rsn in (
+    # in the order the categories are checked
+    ("received a drop", MessageCategory.DROP, False),
+    ("received a clue item", MessageCategory.DROP, False),
+    ("loot from a raid", MessageCategory.DROP, False),
+    ("received an item", MessageCategory.DROP, False),
+    ("completed a quest", MessageCategory.QUEST, False),
+    ("being followed", MessageCategory.PET, False),
+    ("have been followed", MessageCategory.PET, False),
+    ("backpack", MessageCategory.PET, False),
+    ("something special", MessageCategory.PET, False),
+    ("personal best", MessageCategory.PERSONAL_BEST, True),
+    ("collection log item", MessageCategory.COLLECTION_LOG, False),
+    (" combat task", MessageCategory.CB_TASK, True),
+):
+    COLON_PHRASES.setdefault(phrase[-4:], []).append(
+        (phrase, 13 if after_rsn else 0, CATEGORY_RESULT[category])
+    )
+
+# Categories without a colon, first match wins
+NO_COLON_RULES = (
+    (CATEGORY_RESULT[MessageCategory.PK], lambda message:
+        " has defeated " in message
+        and "has been defeated by has defeated" not in message),
+    (CATEGORY_RESULT[MessageCategory.DEATH], lambda message:
+        " defeated by " in message
+        or "has died and lost a life." in message
+        or "has died and lost their Hardcore Ironman status." in message
+        or "has died and lost their hardcore ironman status." in message),
+    (CATEGORY_RESULT[MessageCategory.LEVEL], lambda message:
+        "has reached" in message),
+    (CATEGORY_RESULT[MessageCategory.INVITED], lambda message:
+        "invited into the clan" in message),
+    (CATEGORY_RESULT[MessageCategory.LEFT], lambda message:
+        "has left the clan" in message),
+    (CATEGORY_RESULT[MessageCategory.DIARY], lambda message:
+        "completed" in message and "diary" in message),
+    (CATEGORY_RESULT[MessageCategory.CB_ACHIEVEMENT], lambda message:
+        "Combat Achievement" in message),
+)
+
+
+def classifyMessage(fullStringNoDate: str) -> tuple | None:
+    """
+        Return (MessageCategory, prefix emoji, webhook url) of an in-game
+        message, None for player chat and messages that are not tracked
+    """
+    colonCounter = fullStringNoDate.count(':')
+    if colonCounter == 0:
+        for result, rule in NO_COLON_RULES:
+            if rule(fullStringNoDate):
+                return result
+        return None
+
+    colonIndex = fullStringNoDate.index(':')
+    if colonCounter == 1:
+        for phrase, minColonIndex, result in COLON_PHRASES.get(
+            fullStringNoDate[colonIndex - 4:colonIndex], ()
+        ):
+            if colonIndex >= minColonIndex and fullStringNoDate.endswith(phrase, 0, colonIndex):
+                return result
+        return None
+
+    # Several colons, e.g. "(team size: 5) ... personal best: 29:43"
+    if colonIndex > 12:
+        if "personal best:" in fullStringNoDate:
+            return CATEGORY_RESULT[MessageCategory.PERSONAL_BEST]
+        if " combat task:" in fullStringNoDate:
+            return CATEGORY_RESULT[MessageCategory.CB_TASK]
+    return None
+
+# FIXME: need to handle player-messages? or not?
+#   if no category matched, message is a chat message sent by a player
 
 
 def getMessageCategory(fullStringNoDate: str) -> dict | None:
@@ -58,7 +200,7 @@ def getMessageCategory(fullStringNoDate: str) -> dict | None:
 
         Example of an in-game message:
             <:TaskMastericon:1147705076677345322>
-            ScytheMane has completed the Hard Kandarin diary\.
+            ScytheMane has completed the Hard Kandarin diary.
 
         Parameters
         ----------
@@ -70,287 +212,15 @@ def getMessageCategory(fullStringNoDate: str) -> dict | None:
         dict
             The webhook url, message, and MessageCategory as a dictionary
     """
-
-    #PHRASES
-    substringHasDefeated = " has defeated "
-    substringDefeatedBy = " defeated by "
-    substringHCIMDeath = "has died and lost a life."
-    substringHCIMDeath2 = "has died and lost their Hardcore Ironman status."
-    substringHCIMDeath3 = "has died and lost their hardcore ironman status."
-    substringReceivedADrop = "received a drop:"
-    substringReceivedItem = "received an item:"
-    substringReceivedARaid = "loot from a raid:"
-    substringReceivedAClue= "received a clue item:"
-    substringLevel = "has reached"
-    substringQuest = "completed a quest:"
-    substringPet = "being followed:"
-    substringPet2 = "have been followed:"
-    substringPet3 = "backpack:"
-    substringPet4 = "something special:"
-    substringBest = "personal best:"
-    substringBest2 = "Size:"
-    substringCollection = "collection log item:"
-    substringCombatAchievement = "Combat Achievement"
-    substringCombatTask = " combat task:"
-    substringInviteToClan = "invited into the clan"
-    substringLeftClan = "has left the clan"
-    substringJoinClanChat = "has joined."
-    substringLeftClanChat = "has left."
-    
-    colonCounter = fullStringNoDate.count(':')
-
-    # If default value is returned, failed to capture all cases!
-    messageCategory = MessageCategory.IDK
-
-    content_dict = None
-
-    if colonCounter==0 and substringHasDefeated in fullStringNoDate and "has been defeated by has defeated" not in fullStringNoDate:
-        prefix=":skull_crossbones:"
-        # pks
-        messageCategory = MessageCategory.PK
-        url = webhook_config.PK_URL
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-    elif colonCounter==0 and (substringDefeatedBy in fullStringNoDate or substringHCIMDeath in fullStringNoDate or substringHCIMDeath2 in fullStringNoDate or substringHCIMDeath3 in fullStringNoDate):
-        prefix=":headstone:"
-
-        # deaths
-        messageCategory = MessageCategory.DEATH
-        url = webhook_config.DEATH_URL
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-    elif (colonCounter==1 and substringReceivedADrop in fullStringNoDate) or (colonCounter==1 and substringReceivedAClue in fullStringNoDate) or (colonCounter==1 and substringReceivedARaid in fullStringNoDate)or (colonCounter==1 and substringReceivedItem in fullStringNoDate):
-        prefix=":moneybag:"
-
-        # drops
-        messageCategory = MessageCategory.DROP
-        url = webhook_config.DROP_URL
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory,
-        }
-
-    elif colonCounter==0 and substringLevel in fullStringNoDate:
-        prefix=":partying_face:"
-
-        # levels
-        messageCategory = MessageCategory.LEVEL
-        url = webhook_config.LEVEL_URL
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-    elif colonCounter==1 and substringQuest in fullStringNoDate:
-        prefix=":tada:"
-
-        # quests
-        messageCategory = MessageCategory.QUEST
-        url = webhook_config.QUEST_URL
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-    elif (colonCounter==1 and substringPet in fullStringNoDate) or (colonCounter==1 and substringPet2 in fullStringNoDate) or (colonCounter==1 and substringPet3 in fullStringNoDate) or (colonCounter==1 and substringPet4 in fullStringNoDate):
-        prefix=":dragon:"
-
-        # pet
-        messageCategory = MessageCategory.PET
-        url = webhook_config.PET_URL
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-
-    elif (substringBest in fullStringNoDate and fullStringNoDate.index(':')>12):
-        prefix=":medal:"
-
-        # personal best
-        messageCategory = MessageCategory.PERSONAL_BEST
-        url = webhook_config.PERSONAL_BEST_URL
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-    elif colonCounter==1 and substringCollection in fullStringNoDate:
-        prefix=":closed_book:"
-
-        # collection
-        messageCategory = MessageCategory.COLLECTION_LOG
-        url = webhook_config.COLLECTION_LOG_URL
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-    elif colonCounter==0 and substringInviteToClan in fullStringNoDate:
-        prefix=":slight_smile:"
-
-        # invite to clan
-        messageCategory = MessageCategory.INVITED
-        url = webhook_config.INVITED_URL
-
-        # removed webhook=line
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-    elif colonCounter==0 and substringLeftClan in fullStringNoDate:
-        prefix=":cry:"
-
-        # left clan
-        url = webhook_config.LEFT_URL
-        messageCategory = MessageCategory.LEFT
-
-        # removed webhook=line
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-    elif colonCounter==0 and "completed" in fullStringNoDate and "diary" in fullStringNoDate:
-        prefix=":green_book:"
-
-        # diary
-        messageCategory = MessageCategory.DIARY
-        url = webhook_config.DIARY_URL
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-    elif colonCounter==0 and substringCombatAchievement in fullStringNoDate:
-        prefix=":blue_book:"
-
-        # combat achievement
-        messageCategory = MessageCategory.CB_ACHIEVEMENT
-        url = webhook_config.CB_ACHIEVEMENT_URL
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-    elif colonCounter>=1 and substringCombatTask in fullStringNoDate and (fullStringNoDate.index(':')>12):
-        prefix=":crossed_swords:"
-
-        # combat task
-        messageCategory = MessageCategory.CB_TASK
-        url = webhook_config.CB_TASK_URL
-        content_dict = {
-            "url" : url,
-            "message" : prefix+" "+fullStringNoDate,
-            "category" : messageCategory
-        }
-
-    # elif colonCounter==0 and "unlocked" in fullStringNoDate and "League" in fullStringNoDate:
-    #     prefix="<:leagues:1165723439596847245>"
-    #     url = webhook_config.BINGO_URL
-    #     await trySendWebhook(url, prefix+" "+fullStringNoDate)
-    # elif colonCounter==0 and "mastery" in fullStringNoDate:
-    #     prefix="<:leagues:1165723439596847245>"
-    #     url = webhook_config.BINGO_URL
-    #     await trySendWebhook(url, prefix+" "+fullStringNoDate)
-    # elif colonCounter==0 and ("rank" in fullStringNoDate or "Rank" in fullStringNoDate):
-    #     prefix="<:leagues:1165723439596847245>"
-    #     url = webhook_config.BINGO_URL
-    #     await trySendWebhook(url, prefix+" "+fullStringNoDate)
-    # elif colonCounter==0 and ("trophy" in fullStringNoDate or "Trophy" in fullStringNoDate):
-    #     prefix="<:leagues:1165723439596847245>"
-    #     url = webhook_config.BINGO_URL
-    #     await trySendWebhook(url, prefix+" "+fullStringNoDate)
-    # elif colonCounter==0 and ("League" in fullStringNoDate or "league" in fullStringNoDate or "Leagues" in fullStringNoDate or "League" in fullStringNoDate):
-    #     prefix="<:leagues:1165723439596847245>"
-    #     url = webhook_config.BINGO_URL
-    #     await trySendWebhook(url, prefix + " " + fullStringNoDate)
-
-    # FIXME: need to handle player-messages? or not?
-    # elif (colonCounter==1) and (fullStringNoDate.index(':')<=12):
-    # if it made it this far, message is a chatg message sent by a player
-
-    # BINGO
-        #   Check for
-        #   fang, 2 cox weapons, tome of fire, full moons set
-    if content_dict:
-        bingo_drops = [
-            # 3 fangs
-            "Osmumten's fang",
-            # 2 Cox weapons
-            "Twisted buckler", "Dragon hunter crossbow",
-            "Dinh's bulwark", "Dragon claws", "Elder maul", "Kodai insignia",
-            "Twisted bow",
-            # Tome of fire
-            "Tome of fire",
-            # A full moons set
-            "Eclipse atlatl", "Eclipse moon helm", "Eclipse moon chestplate",
-            "Eclipse moon tassets",
-            "Dual macuahuitl", "Blood moon helm", "Blood moon chestplate",
-            "Blood moon tassets",
-            "Blue moon spear", "Blue moon helm", "Blue moon chestplate",
-            "Blue moon tassets",
-            # Medium clue boots
-            "Ranger boots", "Wizard boots", "Holy sandals", "Spiked manacles",
-            "Climbing boots (g)"
-            # Any full godsword
-            "Godsword shard", "Ancient hilt", "Armadyl hilt", "Bandos hilt",
-            "Saradomin hilt", "Zamorak hilt"
-            # Master clue ornament kit
-            "Occult ornament kit", "Torture ornament kit", "Anguish ornament kit",
-            "Tormented ornament kit", "Dragon defender ornament kit",
-            "Armadyl godsword ornament kit", "Bandos godsword ornament kit",
-            "Saradomin godsword ornament kit", "Zamorak godsword ornament kit",
-            "Dragon platebody ornament kit", "Dragon kiteshield ornament kit",
-            # Any vestige
-            "vestige",
-            # Any rev weapon
-            "Craw's bow", "Thammaron's sceptre", "Viggora's chainmace",
-            # Scurrius pet
-            "Scurry",
-            # 2 Nex drops
-            "Zaryte vambraces", "Nihil horn", "Torva full helm (damaged)",
-            "Torva platebody (damaged)", "Torva platelegs (damaged)",
-            "Ancient hilt",
-            # Zolcano item
-            "Crystal tool seed", "Zalcano shard", "Smolcano",
-            # Master wand
-            "Master wand"
-            # 2 obby armor pieces
-            "Obsidian helmet", "Obsidian platebody", "Obsidian platelegs",
-            "Toktz-ket-xil", "Obsidian cape",
-            # All 3 zulrah OR mutagen
-            "mutagen", "Tanzanite fang", "Magic fang", "Serpentine visage",
-            # Corp sigil
-            "Arcane sigil", "Elysian sigil", "Spectral sigil",
-            # Moxy or Huberte pet
-            "Moxi", "Huberte",
-            # Mole slippers
-            "Mole slippers",
-            # Noxious hally - 3 pieces
-            "Noxious point", "Noxious blade", "Noxious pommel",
-            # Cerb crystal
-            "Primordial crystal", "Pegasian crystal", "Eternal crystal",
-            "Smouldering stone",
-            # 3 aranea boots
-            "Aranea boots",
-            # Earth warrior champion scroll
-            "Earth warrior champion scroll",
-            # Teleport anchoring scroll
-            "Teleport anchoring scroll",
-            # Golden tench
-            "Golden tench"
-        ]
-
-    return content_dict if content_dict else None
+    result = classifyMessage(fullStringNoDate)
+    if result is None:
+        return None
+    messageCategory, prefix, url = result
+    return {
+        "url": url,
+        "message": prefix + " " + fullStringNoDate,
+        "category": messageCategory
+    }
 
 
 def extractRSN(ccMessageNoDate: str, messageCategory: MessageCategory) -> str:
@@ -430,10 +300,13 @@ def extractDrop(ccMessageNoDate: str, messageCategory: MessageCategory) -> str |
     return None
 
 
-async def extractLootValue(ccMessageNoDate: str, messageCategory: MessageCategory) -> str | None:
+def extractLootValue(ccMessageNoDate: str, messageCategory: MessageCategory) -> str | None:
     """
         Extracts the value from messages that are 
         MessageCategory.PK or MessageCategory.DROP
+
+        Messages without a coins value are priced from price_service's
+        snapshot, never over the network. Unknown items are worth "0".
     """
     # check if character after ( is a digit
     # check if a character before ) is 's' for coin's' in string
@@ -457,60 +330,12 @@ async def extractLootValue(ccMessageNoDate: str, messageCategory: MessageCategor
                     coinsStr = ccMessageNoDate[coinsBeginIndex:coinsEndingIndex]
             else:
                 # No parentheses
-                # Make API call to get real-time price
-                item_to_id = {
-                    # Cox items
-                    "Arcane prayer scroll": "21079",
-                    "Dexterous prayer scroll": "21034",
-                    "Twisted buckler": "21000",
-                    "Dragon hunter crossbow": "21012",
-                    "Dinh's bulwark": "21015",
-                    "Ancestral hat": "21018",
-                    "Ancestral robe top": "21021",
-                    "Ancestral robe bottom": "21024",
-                    "Dragon claws": "13652",
-                    "Elder maul": "21003",
-                    "Kodai insignia": "21043",
-                    "Twisted bow": "20997",
-                    # Toa items
-                    "Osmumten's fang": "26219",
-                    "Lightbearer": "25975",
-                    "Elidinis' ward": "25985",
-                    "Masori mask": "27226",
-                    "Masori body": "27229",
-                    "Masori chaps": "27232",
-                    "Tumeken's shadow (uncharged)": "27277",
-                    # Tob items
-                    "Avernic defender hilt": "22477",
-                    "Ghrazi rapier": "22324",
-                    "Sanguinesti staff (uncharged)": "22481",
-                    "Justiciar faceguard": "22326",
-                    "Justiciar chestguard": "22327",
-                    "Justiciar legguards": "22328",
-                    "Scythe of vitur (uncharged)": "22486",
-                }
-
-                
-                url = "https://prices.runescape.wiki/api/v1/osrs/latest"
-                headers = {
-                    'User-Agent': 'Drops Tracker for discord server',
-                }
-                params = {
-                    "id": 1    # must change
-                }
-                # Find substr and store key-value
-                for key, value in item_to_id.items():
-                    if key in ccMessageNoDate:
-                        params["id"] = value
-                        item_id = value
-                        break
-
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url, params=params, headers=headers) as resp:
-                        data = await resp.json()
-                        data = data['data'][f"{item_id}"]
-                        coinsInt = data['low']
-                    coinsStr = format(coinsInt, ',')
+                # Price the item from the latest price snapshot
+                #   The item is named after the colon, the rsn could be an item too
+                itemText = ccMessageNoDate[ccMessageNoDate.rfind(':') + 1:].strip().rstrip('.')
+                item_id = item_catalog.find_id(itemText)
+                coinsInt = (price_service.get_price(item_id) or 0) if item_id is not None else 0
+                coinsStr = format(coinsInt, ',')
                 
             return coinsStr.replace(',', '')
         except ValueError as e:
@@ -541,157 +366,260 @@ def extractTimeInSeconds(ccMessageNoDate: str) -> str:
     return pbTimeSeconds
 
 
-def checkForBingoDrop(fullStringNoDate: str, content_dict: dict):
+class BingoBoard:
     """
-        Determine the appropriate webhook url, message, and
-        MessageCategory from an in-game message
+        Bingo items and team rosters, loaded from a JSON file
+
+        {
+            "items": {"<board tile>": ["<item>", ...], ...},
+            "teams": {"<team name>": ["<rsn>", ...], ...}
+        }
+
+        Items are compiled into one regex so a message is scanned once, and
+        RSNs are looked up case-insensitively in a dict. The file is checked
+        for changes at most every reload_interval seconds and reloaded when
+        it was modified, so the board can change without a redeploy.
+    """
+    def __init__(self, path: str, reload_interval: float = 5):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.item_pattern: re.Pattern | None = None
+        self.team_by_rsn: dict[str, str] = {}
+        self.rsn_prefix_pattern: re.Pattern | None = None
+        self._mtime: float | None = None
+        self._checked_at = float("-inf")
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._mtime:
+                return
+            with open(self.path, 'r') as f:
+                self.load_data(json.load(f))
+        except Exception as e:
+            # keep the last good board
+            logger.error(f"Failed to load bingo board from {self.path}: {e}")
+            return
+        self._mtime = mtime
+
+    def load_data(self, data: dict):
+        """
+            Replace the board with data, in the bingo file's format
+        """
+        items = [item for tile in data["items"].values() for item in tile]
+        team_by_rsn = {
+            rsn.lower(): team
+            for team, rsns in data["teams"].items()
+            for rsn in rsns
+        }
+        self.item_pattern = (
+            re.compile("|".join(re.escape(item) for item in items))
+            if items else None
+        )
+        self.team_by_rsn = team_by_rsn
+        # Longest first, for messages without an extractable RSN
+        self.rsn_prefix_pattern = re.compile(
+            "(" + "|".join(
+                re.escape(rsn) for rsn in sorted(team_by_rsn, key=len, reverse=True)
+            ) + ") ",
+            re.IGNORECASE
+        )
+        self._checked_at = time.monotonic()
+        logger.info(f"Loaded bingo board: {len(items)} items, {len(team_by_rsn)} players")
+
+    def is_bingo_drop(self, message: str) -> bool:
+        return self.item_pattern is not None and self.item_pattern.search(message) is not None
+
+    def get_team(self, message: str, rsn: str | None) -> str | None:
+        if rsn:
+            return self.team_by_rsn.get(rsn.lower())
+        if self.rsn_prefix_pattern is None:
+            return None
+        match = self.rsn_prefix_pattern.match(message)
+        return self.team_by_rsn.get(match.group(1).lower()) if match else None
+
+
+bingo_board = BingoBoard(BINGO_FILE)
+
+
+def checkForBingoDrop(fullStringNoDate: str, content_dict: dict, rsn: str | None = None):
+    """
+        Flag bingo drops and the bingo team of the player who got them
 
         Example of an in-game message:
             <:TaskMastericon:1147705076677345322>
-            ScytheMane has completed the Hard Kandarin diary\.
+            ScytheMane has completed the Hard Kandarin diary.
 
         Parameters
         ----------
         fullStringNoDate: str
             Runescape message without the preceding emoji
 
+        content_dict: dict
+            Result of getMessageCategory for the message
+
+        rsn: str | None
+            The player's RSN, extracted from the message if not given
+
         Returns
         -------
         dict
-            The webhook url, message, and MessageCategory as a dictionary
+            content_dict with "is_bingo" and, for players on a bingo team,
+            "bingo_team" added
     """
     if content_dict:
-        content_dict["is_bingo"] = False  # default value
-
-        bingo_drops = [
-            # 3 fangs
-            "Osmumten's fang",
-            # 2 Cox weapons
-            "Dragon hunter crossbow",
-            "Dinh's bulwark", "Dragon claws", "Elder maul", "Kodai insignia",
-            "Twisted bow",
-            # Tome of fire
-            "Tome of fire",
-            # A full moons set
-            "Eclipse atlatl", "Eclipse moon helm", "Eclipse moon chestplate",
-            "Eclipse moon tassets",
-            "Dual macuahuitl", "Blood moon helm", "Blood moon chestplate",
-            "Blood moon tassets",
-            "Blue moon spear", "Blue moon helm", "Blue moon chestplate",
-            "Blue moon tassets",
-            # Medium clue boots
-            "Ranger boots", "Wizard boots", "Holy sandals", "Spiked manacles",
-            "Climbing boots (g)",
-            # Any full godsword
-            "Godsword shard", "Ancient hilt", "Armadyl hilt", "Bandos hilt",
-            "Saradomin hilt", "Zamorak hilt",
-            # Master clue ornament kit
-            "Occult ornament kit", "Torture ornament kit", "Anguish ornament kit",
-            "Tormented ornament kit", "Dragon defender ornament kit",
-            "Armadyl godsword ornament kit", "Bandos godsword ornament kit",
-            "Saradomin godsword ornament kit", "Zamorak godsword ornament kit",
-            "Dragon platebody ornament kit", "Dragon kiteshield ornament kit",
-            # Any vestige
-            "vestige",
-            # Any rev weapon
-            "Craw's bow", "Thammaron's sceptre", "Viggora's chainmace",
-            # Scurrius pet
-            "Scurry",
-            # 2 Nex drops
-            "Zaryte vambraces", "Nihil horn", "Torva full helm (damaged)",
-            "Torva platebody (damaged)", "Torva platelegs (damaged)",
-            "Ancient hilt",
-            # Zolcano item
-            "Crystal tool seed", "Zalcano shard", "Smolcano",
-            # Master wand
-            "Master wand",
-            # 2 obby armor pieces
-            "Obsidian helmet", "Obsidian platebody", "Obsidian platelegs",
-            # All 3 zulrah OR mutagen
-            "Magma mutagen", "Tanzanite mutagen",
-            "Tanzanite fang", "Magic fang", "Serpentine visage",
-            # Corp sigil
-            "Arcane sigil", "Elysian sigil", "Spectral sigil",
-            # Moxy or Huberte pet
-            "Moxi", "Huberte",
-            # Mole slippers
-            "Mole slippers",
-            # Noxious hally - 3 pieces
-            "Noxious point", "Noxious blade", "Noxious pommel",
-            # Cerb crystal
-            "Primordial crystal", "Pegasian crystal", "Eternal crystal",
-            "Smouldering stone",
-            # 3 aranea boots
-            "Aranea boots",
-            # Earth warrior champion scroll
-            "Earth warrior champion scroll",
-            # Teleport anchoring scroll
-            "Teleport anchoring scroll",
-            # Golden tench
-            "Golden tench",
-            # Merfolk trident
-            "Merfolk trident",
-        ]
-        # 18 names including dabbd out, which is not explicitly written
-        team_j22 = [
-            "420Caveman",
-            "BigBossHoss",
-            "Damonster1",
-            "HC-Chyne",
-            "Hunglllef",
-            "Iron H E R B",
-            "J-22",
-            "jibbuh",
-            "Pl0uneR0yale",
-            "ryanlul",
-            "Saucemanchie",
-            "Spahrten",
-            "steamyplank",
-            "Ur left nut",
-            "yea im jebus",
-            "GART0U",
-            "m8t",
-        ]
-        # 18 names with little rat
-        team_vendirz = [
-            "Cheeky",
-            "elf on duty",
-            "JacobPiment",
-            "K l W l",
-            "Little Rat",
-            "MarlinMerlin",
-            "Mike Kent",
-            "Nokowt",
-            "Plankforpurp",
-            "Schm0ke",
-            "ThatGuyHarm",
-            "Toxic Suns",
-            "turbo_z31",
-            "UlfhednarTaz",
-            "Vendirzy", # included both vendirz name since not sure which is being used for bingo
-            "vendirz",
-            "Waterri",
-            "X x o xx",
-            "Little Rat",
-        ]
-
-        # Determine if drop is bingo-related
-        for drop in bingo_drops:
-            if drop in fullStringNoDate:
-                content_dict["is_bingo"] = True
-                break
-
-        # Now determine team - j22 or vendirz
-        for name in team_j22:
-            if name in fullStringNoDate:
-                # send to j22 drop webhook
-                content_dict["bingo_team"] = "j22"
-                return content_dict
-
-        for name in team_vendirz:
-            if name in fullStringNoDate:
-                # send to vendirz drop webhook
-                content_dict["bingo_team"] = "vendirz"
-                return content_dict
+        bingo_board.maybe_reload()
+        content_dict["is_bingo"] = bingo_board.is_bingo_drop(fullStringNoDate)
+
+        if rsn is None:
+            rsn = extractRSN(fullStringNoDate, content_dict["category"])
+        team = bingo_board.get_team(fullStringNoDate, rsn)
+        if team:
+            content_dict["bingo_team"] = team
 
     return content_dict
+
+
+@dataclass(slots=True)
+class GameChatRecord:
+    """
+        Everything the bot needs from one in-game message
+
+        loot_value is None for drops whose message has no coins value, the
+        price has to be looked up. duration is the personal best in seconds.
+        message_id is the Discord message the record was read from, stored
+        so the same message is never counted twice.
+    """
+    category: MessageCategory
+    url: str
+    message: str    # with the category's prefix emoji, for the webhook
+    rsn: str = ""
+    item: str | None = None
+    boss: str | None = None
+    loot_value: int | None = None
+    duration: float | None = None
+    is_bingo: bool = False
+    bingo_team: str | None = None
+    message_id: int | None = None
+
+
+def _parseCoins(ccMessageNoDate: str, openIndex: int) -> int:
+    """
+        The "(1,234 coins)" value, same rules as extractLootValue
+    """
+    closeIndex = ccMessageNoDate.find(')')
+    if closeIndex == -1 or openIndex + 1 >= len(ccMessageNoDate):
+        return 0
+    if ccMessageNoDate[openIndex + 1].isdigit() and ccMessageNoDate[closeIndex - 1] == 's':
+        coinsStr = ccMessageNoDate[openIndex + 1:closeIndex - 6]
+    else:
+        # skip e.g. "(g)" or "(damaged)" in the item name
+        rest = ccMessageNoDate[closeIndex + 1:]
+        openIndex = rest.find('(')
+        closeIndex = rest.find(')')
+        if openIndex == -1 or closeIndex == -1:
+            return 0
+        coinsStr = rest[openIndex + 1:closeIndex - 6]
+    try:
+        return int(coinsStr.replace(',', ''))
+    except ValueError:
+        return 0
+
+
+def _parseDuration(timeString: str) -> float | None:
+    """
+        "1:02:45.60" or "29:43" in seconds, same rules as extractTimeInSeconds
+    """
+    parts = timeString.split(':')
+    try:
+        if len(parts) == 3:
+            return int(parts[0]) * 60 * 60 + int(parts[1]) * 60 + float(parts[2])
+        elif len(parts) == 2:
+            return int(parts[0]) * 60 + float(parts[1])
+    except ValueError:
+        pass
+    return None
+
+
+def parseGameChatMessage(ccMessageNoDate: str) -> GameChatRecord | None:
+    """
+        Classify an in-game message and extract its fields in one go
+
+        Gives the same category, RSN, item, boss, loot value and duration as
+        getMessageCategory, extractRSN, extractDrop, extractBoss,
+        extractLootValue and extractTimeInSeconds, reusing the positions
+        found along the way instead of searching the message again.
+
+        Parameters
+        ----------
+        ccMessageNoDate: str
+            Runescape message without the preceding emoji
+
+        Returns
+        -------
+        GameChatRecord | None
+            None for player chat and messages that are not tracked
+    """
+    result = classifyMessage(ccMessageNoDate)
+    if result is None:
+        return None
+    messageCategory, prefix, url = result
+    rsn = ""
+    item = boss = lootValue = duration = None
+
+    if messageCategory == MessageCategory.PK:
+        rsn = ccMessageNoDate[:ccMessageNoDate.find("defeated") - 5]
+        openIndex = ccMessageNoDate.find('(')
+        if openIndex != -1:
+            lootValue = _parseCoins(ccMessageNoDate, openIndex)
+    elif messageCategory == MessageCategory.DEATH:
+        defeatedIndex = ccMessageNoDate.find("defeated")
+        if defeatedIndex != -1:
+            rsn = ccMessageNoDate[:defeatedIndex - 10]
+        else:
+            # for HC and HGIM deaths
+            rsn = ccMessageNoDate[:ccMessageNoDate.find("has died") - 1]
+        lootValue = 0   # extractLootValue only values PKs and drops
+    elif messageCategory == MessageCategory.DROP:
+        rsn = ccMessageNoDate[:ccMessageNoDate.find("received") - 1]
+        colonIndex = ccMessageNoDate.index(':')
+        openIndex = ccMessageNoDate.find('(')
+        if openIndex != -1:
+            itemEndIndex = ccMessageNoDate.find('(', colonIndex)
+            if itemEndIndex != -1:
+                item = ccMessageNoDate[colonIndex + 1:itemEndIndex].strip()
+            lootValue = _parseCoins(ccMessageNoDate, openIndex)
+        else:
+            item = ccMessageNoDate[colonIndex + 2:-1]
+    elif messageCategory == MessageCategory.LEVEL:
+        rsn = ccMessageNoDate[:ccMessageNoDate.find(" has reached ")]
+    elif messageCategory == MessageCategory.PERSONAL_BEST:
+        # "<rsn> has achieved a new <boss> personal best: <duration>"
+        achievedIndex = ccMessageNoDate.find(" has achieved a new")
+        if achievedIndex != -1:
+            rsn = ccMessageNoDate[:achievedIndex]
+        bossIndex = ccMessageNoDate.find("has achieved a new ")
+        bestIndex = ccMessageNoDate.find(" personal best:")
+        if bossIndex != -1 and bestIndex != -1:
+            boss = ccMessageNoDate[bossIndex + 19:bestIndex]
+        durationIndex = ccMessageNoDate.find("personal best: ")
+        if durationIndex != -1:
+            duration = _parseDuration(ccMessageNoDate[durationIndex + 15:])
+
+    bingo_board.maybe_reload()
+    return GameChatRecord(
+        messageCategory,
+        url,
+        prefix + " " + ccMessageNoDate,
+        rsn,
+        item,
+        boss,
+        lootValue,
+        duration,
+        bingo_board.is_bingo_drop(ccMessageNoDate),
+        bingo_board.get_team(ccMessageNoDate, rsn)
+    )